@@ -0,0 +1,86 @@
+# async_wallex_client.py
+import httpx
+from config import WALLEX_BASE_URL, DEFAULT_HEADERS, HTTP_POOL_MAXSIZE
+
+_http = None
+
+def get_async_http():
+    """Shared httpx.AsyncClient; must be used from the event loop that created it."""
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            base_url=WALLEX_BASE_URL,
+            headers=DEFAULT_HEADERS,
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+            timeout=10,
+        )
+    return _http
+
+async def close_async_http():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+class AsyncWallexClient:
+    """Non-blocking counterpart of WallexClient with the same method names and return values."""
+
+    def __init__(self, api_key=None):
+        self.headers = {"X-API-Key": api_key} if api_key else {}
+        self.http = get_async_http()
+
+    async def get_balances(self):
+        try:
+            resp = await self.http.get("/v1/account/balances", headers=self.headers)
+            if resp.status_code == 200:
+                return resp.json()
+            return {"success": False, "message": f"HTTP {resp.status_code}"}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_coins(self):
+        """لیست مرتب و یکتای ارزهای والکس؛ در صورت خطا None"""
+        try:
+            resp = await self.http.get("/hector/web/v1/markets", headers=self.headers)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('success'):
+                    coins = {m['base_asset'] for m in data['result']['markets'] if m.get('base_asset')}
+                    return sorted(coins)
+        except Exception as e:
+            print(f"Error fetching coins: {e}")
+        return None
+
+    async def get_last_price(self, symbol):
+        try:
+            resp = await self.http.get("/v1/trades", params={"symbol": symbol}, headers=self.headers, timeout=5)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('success'):
+                    return float(data['result']['latestTrades'][0]['price'])
+        except Exception:
+            pass
+        return None
+
+    async def place_order(self, symbol, side, type, quantity, price=None):
+        payload = {"symbol": symbol, "side": side, "type": type, "quantity": str(quantity)}
+        if price: payload["price"] = str(price)
+        try:
+            resp = await self.http.post("/v1/account/orders", json=payload, headers=self.headers)
+            return resp.json()
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_order_status(self, client_order_id):
+        try:
+            resp = await self.http.get(f"/v1/account/orders/{client_order_id}", headers=self.headers)
+            return resp.json()
+        except Exception:
+            return {"success": False}
+
+    async def cancel_order(self, client_order_id):
+        try:
+            await self.http.delete(f"/v1/account/orders/{client_order_id}", headers=self.headers)
+            return {"success": True}
+        except Exception:
+            return {"success": False}
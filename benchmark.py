@@ -0,0 +1,206 @@
+# benchmark.py
+"""
+End-to-end load benchmark: runs main.py against MockExchange and
+MockSignalPool with a seeded throwaway database, then reports
+signal-to-order latency percentiles, orders per second and DB write volume.
+With --push the engine also reads the pool's signal stream (SignalFeed.listen).
+
+    python benchmark.py --users 1000 --signals-per-minute 100 --duration 120
+    python benchmark.py --push --stream-reset-after 5
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_exchange import MockExchange, MockSignalPool
+
+COINS = ('BTC', 'ETH', 'TRX', 'SHIB', 'DOGE', 'ADA', 'XRP', 'LTC', 'BCH', 'DOT',
+         'LINK', 'UNI', 'AVAX', 'SOL', 'MATIC', 'ATOM', 'NEAR', 'FTM', 'SAND', 'MANA')
+STRATEGIES = ('Internal', 'G1', 'Computiational')
+GRADES = ('Q1', 'Q2', 'Q3', 'Q4')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def seed_users(db_path, users, coins_per_user, rng):
+    # Imported here so DB_NAME from the environment is already in effect
+    from database import DatabaseHandler
+    db = DatabaseHandler()
+    db.init_db()
+    conn = db.get_connection()
+    try:
+        rows = []
+        for i in range(users):
+            rows.append((
+                i, f"bench-{i}", f"Bench User {i}", f"bench-key-{i}",
+                1000000, 10, 1000000 * 20, 10 * 20, 2,
+                json.dumps(list(STRATEGIES)), json.dumps(list(GRADES)),
+                json.dumps(rng.sample(COINS, coins_per_user)),
+            ))
+        conn.executemany('''
+            INSERT INTO users (
+                telegram_id, account_name, full_name, wallex_api_key,
+                buy_amount_tmn, buy_amount_usdt, max_frozen_tmn, max_frozen_usdt, stop_loss_percent,
+                allowed_strategies, allowed_grades, allowed_coins, is_active
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ''', rows)
+        conn.commit()
+    finally:
+        conn.dispose()
+
+
+def _db_bytes(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def _process_write_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def signal_latencies(published, order_log):
+    """
+    Matches every BUY order to the latest signal published for its symbol
+    before it arrived. Returns (first-order latencies, all-order latencies).
+    """
+    by_symbol = {}
+    for publish_time, symbol in published:
+        by_symbol.setdefault(symbol, []).append(publish_time)
+    first = {}
+    every = []
+    for arrival, _, symbol, side in order_log:
+        if side != "BUY":
+            continue
+        times = by_symbol.get(symbol)
+        if not times:
+            continue
+        i = bisect.bisect_right(times, arrival) - 1
+        if i < 0:
+            continue
+        latency = arrival - times[i]
+        every.append(latency)
+        key = (symbol, i)
+        first[key] = min(first.get(key, latency), latency)
+    return sorted(first.values()), sorted(every)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="arbit-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "bench.db")
+    env = dict(os.environ,
+               DB_NAME=db_path,
+               TRADE_JOURNAL_PATH=os.path.join(workdir, "trade_journal.log"),
+               TELEGRAM_BOT_TOKEN="",
+               PYTHONUNBUFFERED="1")
+
+    symbols = [f"{coin}TMN" for coin in COINS]
+    exchange = MockExchange(symbols, latency=args.latency, jitter=args.jitter,
+                            fill_probability=args.fill_probability, volatility=args.volatility,
+                            key_rate_limit=args.exchange_key_limit, seed=args.seed).start()
+    pool = MockSignalPool(exchange, COINS, signals_per_minute=args.signals_per_minute,
+                          strategies=STRATEGIES, grades=GRADES, seed=args.seed,
+                          stream_reset_after=args.stream_reset_after)
+    env["WALLEX_BASE_URL"] = exchange.url
+    env["SIGNAL_POOL_URL"] = pool.url
+    if args.push:
+        env["SIGNAL_PUSH_URL"] = pool.stream_url
+    os.environ.update(DB_NAME=db_path)
+    seed_users(db_path, args.users, args.coins_per_user, rng)
+    db_bytes_before = _db_bytes(db_path)
+
+    log = open(os.path.join(workdir, "engine.log"), "w")
+    engine = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")],
+                              env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        time.sleep(args.warmup)
+        pool.start()
+        started = time.time()
+        time.sleep(args.duration)
+        pool.stop()
+        write_bytes = _process_write_bytes(engine.pid)
+    finally:
+        engine.send_signal(signal.SIGINT)
+        try:
+            engine.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            # Takes shard workers down too when the engine runs sharded
+            os.killpg(engine.pid, signal.SIGKILL)
+        # Orders keep arriving while the engine drains its queue, so the rate covers that too
+        elapsed = time.time() - started
+        exchange.stop()
+        log.close()
+
+    conn = sqlite3.connect(db_path)
+    trades = conn.execute("SELECT count(*) FROM trades").fetchone()[0]
+    sells = conn.execute("SELECT count(*) FROM trades WHERE sell_order_id IS NOT NULL").fetchone()[0]
+    conn.close()
+
+    first, every = signal_latencies(pool.published, exchange.order_log)
+    buys = sum(1 for entry in exchange.order_log if entry[3] == "BUY")
+    report = {
+        "users": args.users,
+        "signals_published": len(pool.published),
+        "signals_with_orders": len(first),
+        "duration_s": round(elapsed, 1),
+        "orders": len(exchange.order_log),
+        "buy_orders": buys,
+        "orders_per_s": round(len(exchange.order_log) / elapsed, 1),
+        "first_order_latency_ms": {p: round(percentile(first, p) * 1000) for p in (50, 90, 99, 100)},
+        "fanout_order_latency_ms": {p: round(percentile(every, p) * 1000) for p in (50, 90, 99, 100)},
+        "trades_rows": trades,
+        "trades_with_sell": sells,
+        "db_growth_bytes": _db_bytes(db_path) - db_bytes_before,
+        "engine_write_bytes": write_bytes,
+        "exchange_requests": dict(sorted(exchange.requests.items())),
+        "exchange_429s": exchange.rejected,
+        "stream_connections": pool.streams,
+        "signals_streamed": pool.streamed,
+        "workdir": workdir,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark against a simulated exchange and signal pool")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--coins-per-user", type=int, default=3)
+    parser.add_argument("--signals-per-minute", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=120, help="seconds of signal publishing")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds for the engine to start")
+    parser.add_argument("--latency", type=float, default=0.02, help="exchange response time (s)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random exchange delay (s)")
+    parser.add_argument("--fill-probability", type=float, default=0.3)
+    parser.add_argument("--volatility", type=float, default=0.002, help="price path step stddev")
+    parser.add_argument("--exchange-key-limit", type=int, help="requests per second per API key before 429s")
+    parser.add_argument("--push", action="store_true", help="also deliver signals over the pool's stream")
+    parser.add_argument("--stream-reset-after", type=int,
+                        help="drop each stream after this many signals (exercises reconnect and ?since=)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="where the throwaway DB, journal and engine log go")
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# bot_repository.py
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from database import DatabaseHandler
+from config import BOT_DB_WORKERS
+
+
+class BotRepository:
+    """
+    Data access for the Telegram bot. Every query runs on a dedicated thread
+    pool (each worker keeps its own SQLite connection) and is awaited, so a
+    slow query never blocks the event loop serving other chats.
+    """
+
+    def __init__(self, max_workers=BOT_DB_WORKERS):
+        self.db = DatabaseHandler()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bot-db")
+
+    async def run(self, func, *args):
+        """Runs any blocking callable (e.g. AdminPanel.get_quick_stats) on the pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _count_accounts(self, telegram_id):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute("SELECT count(*) FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def _list_accounts(self, telegram_id):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)).fetchall()
+        finally:
+            conn.close()
+
+    def _create_account(self, telegram_id, d, coins):
+        conn = self.db.get_connection()
+        try:
+            conn.execute('''
+                INSERT INTO users (
+                    telegram_id, account_name, full_name, phone_number, wallex_api_key,
+                    buy_amount_tmn, buy_amount_usdt, stop_loss_percent,
+                    allowed_strategies, allowed_grades, allowed_coins, is_active
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ''', (
+                telegram_id, d['account_name'], d['full_name'], d['phone'], d['api_key'],
+                d['buy_tmn'], d['buy_usdt'], d['stop_loss'],
+                json.dumps(d['strategies']), json.dumps(d['grades']), json.dumps(coins)
+            ))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _toggle_account(self, acc_id):
+        conn = self.db.get_connection()
+        try:
+            curr = conn.execute("SELECT is_active FROM users WHERE id=?", (acc_id,)).fetchone()[0]
+            new_s = 0 if curr else 1
+            conn.execute("UPDATE users SET is_active=? WHERE id=?", (new_s, acc_id))
+            conn.commit()
+            return new_s
+        finally:
+            conn.close()
+
+    def _delete_account(self, acc_id):
+        conn = self.db.get_connection()
+        try:
+            conn.execute("DELETE FROM users WHERE id=?", (acc_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def count_accounts(self, telegram_id):
+        return await self.run(self._count_accounts, telegram_id)
+
+    async def list_accounts(self, telegram_id):
+        return await self.run(self._list_accounts, telegram_id)
+
+    async def create_account(self, telegram_id, data, coins):
+        await self.run(self._create_account, telegram_id, data, coins)
+
+    async def toggle_account(self, acc_id):
+        """Flips is_active and returns the new value."""
+        return await self.run(self._toggle_account, acc_id)
+
+    async def delete_account(self, acc_id):
+        await self.run(self._delete_account, acc_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class HandlerMetrics:
+    """Call count and latency per bot handler."""
+
+    def __init__(self):
+        self.stats = {}  # handler name -> [calls, total_seconds, max_seconds]
+
+    def wrap(self, handler):
+        name = handler.__name__
+
+        @functools.wraps(handler)
+        async def timed(update, context):
+            started = time.perf_counter()
+            try:
+                return await handler(update, context)
+            finally:
+                elapsed = time.perf_counter() - started
+                entry = self.stats.setdefault(name, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] = max(entry[2], elapsed)
+        return timed
+
+    def report(self):
+        lines = []
+        for name, (calls, total, worst) in sorted(self.stats.items()):
+            lines.append(f"{name}: {calls} calls, avg {total / calls * 1000:.0f}ms, max {worst * 1000:.0f}ms")
+        return "\n".join(lines)
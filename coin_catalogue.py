@@ -0,0 +1,56 @@
+# coin_catalogue.py
+import asyncio
+import time
+from async_wallex_client import AsyncWallexClient
+from wallex_client import FALLBACK_COINS
+from config import COIN_CATALOGUE_TTL, COIN_CATALOGUE_RETRY
+
+
+class CoinCatalogue:
+    """
+    Process-wide, sorted tuple of tradable coins for the onboarding flow.
+
+    Refreshed in the background every COIN_CATALOGUE_TTL seconds. A refresh
+    swaps in a new tuple, so a conversation keeps a reference to the tuple
+    it started with and stores selections as indexes into it; no
+    conversation ever copies the list. Until the first load succeeds,
+    FALLBACK_COINS is served and the loop retries every COIN_CATALOGUE_RETRY
+    seconds; a handler never waits on the exchange.
+    """
+
+    def __init__(self, ttl=COIN_CATALOGUE_TTL, retry=COIN_CATALOGUE_RETRY):
+        self.ttl = ttl
+        self.retry = retry
+        self.coins = tuple(FALLBACK_COINS)
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def refresh(self):
+        async with self._lock:
+            coins = await AsyncWallexClient().get_coins()
+            if coins:
+                if tuple(coins) != self.coins:
+                    self.coins = tuple(coins)
+                self.loaded_at = time.monotonic()
+
+    async def get(self):
+        """Returns the current tuple (FALLBACK_COINS until the background refresh has loaded one)."""
+        return self.coins
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Coin catalogue refresh failed: {e}")
+            await asyncio.sleep(self.ttl if self.loaded_at else self.retry)
+
+    def start(self):
+        """Starts the background refresh on the running event loop."""
+        self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -4,12 +4,16 @@ import os
 # ---------------------------------------------------------
 # 1. تنظیمات دیتابیس
 # ---------------------------------------------------------
-DB_NAME = "bot_database.db"
+# مسیرها و آدرس‌ها با متغیر محیطی قابل تغییرند (برای اجرای بنچمارک روی سرور شبیه‌سازی‌شده)
+DB_NAME = os.getenv("DB_NAME", "bot_database.db")
+
+# حداکثر زمان انتظار برای قفل دیتابیس وقتی پروسه دیگری در حال نوشتن است (ثانیه)
+DB_BUSY_TIMEOUT = 10
 
 # ---------------------------------------------------------
 # 2. تنظیمات API والکس (Wallex)
 # ---------------------------------------------------------
-WALLEX_BASE_URL = "https://api.wallex.ir"
+WALLEX_BASE_URL = os.getenv("WALLEX_BASE_URL", "https://api.wallex.ir")
 
 # هدرهای عمومی برای ارسال درخواست‌ها به والکس
 # نکته: User-Agent را شبیه مرورگر می‌گذاریم تا درخواست‌ها بلاک نشوند
@@ -19,16 +23,56 @@ DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) TradingBot/1.0"
 }
 
+# اتصال‌های HTTP به صورت Keep-Alive و مشترک نگه داشته می‌شوند
+# حداکثر تعداد اتصال باز همزمان به والکس
+HTTP_POOL_MAXSIZE = 64
+
+# تعداد تلاش مجدد برای درخواست‌های GET/DELETE در صورت خطای شبکه یا 5xx
+HTTP_MAX_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.3
+
+# حداکثر تعداد کلاینت (کلید API) که در حافظه نگه داشته می‌شود
+CLIENT_CACHE_SIZE = 1024
+
 # ---------------------------------------------------------
 # 3. تنظیمات منبع سیگنال (Signal Pool)
 # ---------------------------------------------------------
 # آدرس دقیق دیتابیس سیگنال شما
-SIGNAL_POOL_URL = "http://103.75.198.172:3000/signal_pool"
+SIGNAL_POOL_URL = os.getenv("SIGNAL_POOL_URL", "http://103.75.198.172:3000/signal_pool")
+
+# (اختیاری) آدرس استریم سیگنال‌ها؛ هر خط یک سیگنال JSON
+# اگر تنظیم شود سیگنال‌ها بلافاصله دریافت می‌شوند و Polling فقط پشتیبان است
+SIGNAL_PUSH_URL = os.getenv("SIGNAL_PUSH_URL") or None
 
 # فاصله زمانی برای چک کردن سیگنال جدید (ثانیه)
 # پیشنهاد: بین 2 تا 5 ثانیه
 SIGNAL_CHECK_INTERVAL = 3
 
+# مدت نگهداری شناسه سیگنال‌های پردازش شده برای جلوگیری از خرید تکراری (ثانیه)
+# باید بیشتر از مدتی باشد که یک سیگنال در Signal Pool باقی می‌ماند
+SIGNAL_DEDUP_WINDOW = 7 * 24 * 3600
+
+# تعداد شناسه‌های اخیر که در حافظه نگه داشته می‌شوند
+SIGNAL_DEDUP_MEMORY_SIZE = 10000
+
+# فاصله پاکسازی شناسه‌های قدیمی (ثانیه)
+SIGNAL_DEDUP_PRUNE_INTERVAL = 3600
+
+# ---------------------------------------------------------
+# زمان‌بندی کارهای دوره‌ای انجین
+# ---------------------------------------------------------
+# هر کار (سیگنال، مانیتورینگ، ریسک، هشدار) روی ترد خودش و با فاصله خودش اجرا می‌شود
+ORDER_MONITOR_INTERVAL = 3
+
+# فاصله ارسال هشدارهای صف شده به ادمین (ثانیه)
+ALERT_FLUSH_INTERVAL = 1
+
+# فاصله چاپ آمار تاخیر کارها (ثانیه)
+JOB_STATS_INTERVAL = 60
+
+# حداکثر تاخیر تصادفی اضافه شده به هر اجرا تا کارها همزمان به API فشار نیاورند (ثانیه)
+JOB_JITTER = 0.2
+
 # ---------------------------------------------------------
 # 4. تنظیمات موتور ترید (Trading Engine)
 # ---------------------------------------------------------
@@ -37,6 +81,46 @@ SIGNAL_CHECK_INTERVAL = 3
 # اگر سفارش خرید بعد از این مدت پر نشد، لغو می‌شود (طبق دستور شما: 1 دقیقه)
 BUY_TIMEOUT_SECONDS = 60
 
+# حداکثر تعداد سفارش‌هایی که برای یک سیگنال به صورت همزمان ارسال می‌شوند
+ORDER_DISPATCH_WORKERS = 32
+
+# محدودیت نرخ درخواست به والکس (درخواست در ثانیه و حداکثر انفجار)
+# درخواست‌های اضافه حذف نمی‌شوند و به ترتیب اولویت در صف می‌مانند
+# والکس سقف عددی منتشر نکرده است؛ این مقادیر فرض محتاطانه هستند. سقف کلی (برای IP سرور)
+# و سقف هر کلید با 429 و Retry-After خودشان را اصلاح می‌کنند؛ اگر متریک rate_limited_total
+# صفر ماند می‌توان آن‌ها را بالا برد. زمان ارسال خرید برای همه کاربران یک سیگنال حدوداً
+# تعداد کاربران تقسیم بر WALLEX_GLOBAL_RATE است (1000 کاربر ≈ 50 ثانیه) و باید
+# خیلی کمتر از BUY_TIMEOUT_SECONDS بماند
+WALLEX_GLOBAL_RATE = float(os.getenv("WALLEX_GLOBAL_RATE", 20))
+WALLEX_GLOBAL_BURST = float(os.getenv("WALLEX_GLOBAL_BURST", 40))
+WALLEX_KEY_RATE = 5
+WALLEX_KEY_BURST = 10
+
+# توکن‌هایی از سقف کلی که خریدهای جدید و بررسی وضعیت نمی‌توانند مصرف کنند و برای
+# خروج اضطراری، قیمت حد ضرر، فروش هدف و لغو سفارش‌ها نگه داشته می‌شوند
+RATE_LIMIT_RESERVE = 5
+# حداقل سهم بررسی وضعیت سفارش‌ها و قیمت‌ها از توکن‌ها وقتی پشت صف خریدها منتظرند
+RATE_LIMIT_LOW_SHARE = 0.3
+
+# تعداد ارسال مجدد درخواستی که با 429 رد شده و مکث پیش‌فرض در نبود Retry-After (ثانیه)
+RATE_LIMIT_MAX_RETRIES = 3
+RATE_LIMIT_DEFAULT_BACKOFF = 1
+
+# تعداد حساب‌هایی که وضعیت سفارش‌هایشان همزمان بررسی می‌شود
+MONITOR_WORKERS = 8
+
+# حداکثر فاصله بررسی سفارش خریدی که وضعیتش تغییر نمی‌کند (ثانیه)
+MONITOR_MAX_BACKOFF = 15
+
+# تغییرات معاملات ابتدا در این فایل لاگ و سپس به صورت گروهی در دیتابیس نوشته می‌شوند
+TRADE_JOURNAL_PATH = os.getenv("TRADE_JOURNAL_PATH", "trade_journal.log")
+
+# فاصله نوشتن گروهی تغییرات معاملات در دیتابیس (ثانیه)
+TRADE_JOURNAL_FLUSH_INTERVAL = 0.2
+
+# اگر این تعداد تغییر در صف باشد، بدون انتظار نوشته می‌شوند
+TRADE_JOURNAL_BATCH_SIZE = 500
+
 # ---------------------------------------------------------
 # 5. تنظیمات مدیریت ریسک و نقدشوندگی سریع (Risk Manager)
 # ---------------------------------------------------------
@@ -44,6 +128,15 @@ BUY_TIMEOUT_SECONDS = 60
 # فاصله زمانی بررسی حد ضرر معاملات باز (ثانیه)
 RISK_CHECK_INTERVAL = 5
 
+# مدت اعتبار قیمت‌های کش شده برای بررسی حد ضرر (ثانیه)
+# عمداً کمتر از RISK_CHECK_INTERVAL است: حد ضرر نباید با قیمت دور قبل تصمیم بگیرد،
+# پس هر دور بررسی قیمت‌ها را دوباره می‌گیرد (در متریک‌ها miss) و صرفه‌جویی کش
+# این است که در یک دور برای هر نماد فقط یک بار قیمت گرفته می‌شود، نه برای هر معامله
+PRICE_CACHE_TTL = 2
+
+# فاصله به‌روزرسانی مشخصات بازارها (دقت قیمت/مقدار، حداقل سفارش) در پس‌زمینه (ثانیه)
+MARKET_REFRESH_INTERVAL = 600
+
 # تعداد تلاش‌ها برای فروش اضطراری (Chasing)
 # وقتی حد ضرر فعال شود، چند بار سعی کند با قیمت جدید بفروشد؟
 CHASING_ATTEMPTS = 10
@@ -51,15 +144,45 @@ CHASING_ATTEMPTS = 10
 # تاخیر بین هر تلاش فروش اضطراری (ثانیه)
 CHASING_DELAY = 2
 
+# فروش اضطراری با قیمتی که کل مقدار را در دفتر سفارش (bids) پر می‌کند ثبت می‌شود
+# یک دفتر سفارش برای هر نماد حداکثر این مدت بین خروج‌های همزمان مشترک است (ثانیه)
+EXIT_DEPTH_TTL = 1
+
+# مکث قبل از بررسی پر شدن سفارشی که با قیمت دفتر سفارش ثبت شده (ثانیه)
+EXIT_FILL_CHECK_DELAY = 0.5
+
+# حداکثر تعداد فروش اضطراری که همزمان اجرا می‌شوند
+# بقیه در صف می‌مانند و حلقه اصلی منتظر آن‌ها نمی‌ماند
+MAX_CONCURRENT_EXITS = 16
+
 # ---------------------------------------------------------
 # 6. تنظیمات تلگرام (Telegram)
 # ---------------------------------------------------------
 # توکن ربات تلگرام خود را اینجا قرار دهید
 # یا بهتر است از os.getenv('TELEGRAM_TOKEN') استفاده کنید
-TELEGRAM_BOT_TOKEN = "8160137815:AAFkRCWEIUTAUVZWcGDqvgH8z-meVoSu-FM"
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8160137815:AAFkRCWEIUTAUVZWcGDqvgH8z-meVoSu-FM")
 
 # لیست ادمین‌ها (اختیاری: برای محدود کردن دسترسی به ربات در آینده)
 
 ADMIN_IDS = [119385059]
 
+# مدت اعتبار لیست ارزهای والکس در ربات؛ در پس‌زمینه به‌روز می‌شود (ثانیه)
+COIN_CATALOGUE_TTL = 1800
+# تا وقتی لیست هیچ‌وقت دریافت نشده، فاصله تلاش مجدد در پس‌زمینه (ثانیه)
+COIN_CATALOGUE_RETRY = 30
+
+# تعداد رشته‌های اجرای کوئری‌های دیتابیس ربات (تا حلقه‌ی رویداد بلاک نشود)
+BOT_DB_WORKERS = 4
+
+# حداکثر تعداد کیبوردهای ساخته‌شده‌ی نگهداری‌شده در کش ربات
+KEYBOARD_CACHE_SIZE = 2048
+
+# آدرس محلی برای ارائه متریک‌ها با فرمت Prometheus در مسیر /metrics (None = غیرفعال)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108")) or None
+
+# تعداد پروسه‌های انجین؛ کاربران بر اساس id بین آن‌ها تقسیم می‌شوند (1 = یک پروسه)
+ENGINE_SHARDS = int(os.getenv("ENGINE_SHARDS", "1"))
 
+# فاصله بررسی زنده بودن شاردها و اجرای مجدد شارد متوقف‌شده (ثانیه)
+SHARD_SUPERVISE_INTERVAL = 5
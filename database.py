@@ -1,17 +1,188 @@
 # database.py
 import sqlite3
-import json
-from config import DB_NAME
+import calendar
+import threading
+import time
+from datetime import datetime
+from config import DB_NAME, DB_BUSY_TIMEOUT
+from metrics import DB_QUERY_SECONDS
+
+def _statement_kind(sql):
+    word = sql.lstrip().split(None, 1)
+    return word[0].upper() if word else ""
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records each statement's duration (up to its first row) in db_query_seconds."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=_statement_kind(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=_statement_kind(sql))
+
+class PersistentConnection(sqlite3.Connection):
+    """
+    A thread's long-lived connection. Callers keep the usual
+    get_connection() / close() pairing, but close() only releases the
+    connection: once the last holder in the thread releases it, any
+    uncommitted transaction is rolled back (as a real close would do)
+    and the connection stays open for the next get_connection().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holders = 0
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of Connection.execute*() bypass cursor(); route them through it so they are timed
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        self.holders = max(0, self.holders - 1)
+        if self.holders == 0 and self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        super().close()
+
+
+# Prices are REAL and times are Unix epoch seconds so hot paths never parse strings
+TRADES_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            coin_pair TEXT,
+            signal_entry_price REAL,
+            signal_target_price REAL,
+            strategy_name TEXT,
+            signal_grade TEXT,
+            buy_order_id TEXT,
+            buy_amount REAL,
+            buy_status TEXT,
+            buy_submit_time INTEGER,                -- Unix epoch seconds
+            sell_order_id TEXT,
+            sell_status TEXT,
+            log_message TEXT,
+            created_at INTEGER DEFAULT (strftime('%s', 'now')),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        '''
+
+TRADES_COLUMNS = (
+    'id', 'user_id', 'coin_pair', 'signal_entry_price', 'signal_target_price',
+    'strategy_name', 'signal_grade', 'buy_order_id', 'buy_amount', 'buy_status',
+    'buy_submit_time', 'sell_order_id', 'sell_status', 'log_message', 'created_at'
+)
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+def _to_epoch(value, utc=False):
+    """Converts the old TEXT timestamps (local datetime.now() or UTC CURRENT_TIMESTAMP) to epoch seconds."""
+    if value in (None, '') or isinstance(value, (int, float)):
+        return value
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return calendar.timegm(parsed.timetuple()) if utc else int(parsed.timestamp())
+    return None
+
+def _migration_1_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_buy_status ON trades (buy_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_sell_status ON trades (sell_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_user_id ON trades (user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users (telegram_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_is_active ON users (is_active)")
+
+def _migration_2_typed_trades(cursor):
+    column_types = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(trades)")}
+    if column_types['signal_entry_price'] != 'REAL':
+        # SQLite cannot change a column type in place: copy into a freshly created table
+        rows = cursor.execute(f"SELECT {', '.join(TRADES_COLUMNS)} FROM trades").fetchall()
+        cursor.execute("DROP TABLE trades")
+        cursor.execute(TRADES_SCHEMA)
+        cursor.executemany(
+            f"INSERT INTO trades ({', '.join(TRADES_COLUMNS)}) VALUES ({', '.join('?' * len(TRADES_COLUMNS))})",
+            [(
+                row['id'], row['user_id'], row['coin_pair'],
+                _to_float(row['signal_entry_price']), _to_float(row['signal_target_price']),
+                row['strategy_name'], row['signal_grade'], row['buy_order_id'], row['buy_amount'],
+                row['buy_status'], _to_epoch(row['buy_submit_time']), row['sell_order_id'],
+                row['sell_status'], row['log_message'], _to_epoch(row['created_at'], utc=True),
+            ) for row in rows]
+        )
+        _migration_1_indexes(cursor)
+
+def _migration_3_drop_open_positions_index(cursor):
+    # Covered RiskManager's open-position scan, which PositionBook replaced; it only slowed writes
+    cursor.execute("DROP INDEX IF EXISTS idx_trades_open_positions")
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    _migration_1_indexes,
+    _migration_2_typed_trades,
+    _migration_3_drop_open_positions_index,
+]
+
+_local = threading.local()
 
 class DatabaseHandler:
     def __init__(self):
         self.db_name = DB_NAME
 
     def get_connection(self):
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
+        """Returns this thread's persistent WAL connection to the database."""
+        connections = _local.__dict__.setdefault('connections', {})
+        conn = connections.get(self.db_name)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=DB_BUSY_TIMEOUT, factory=PersistentConnection)
+            conn.row_factory = sqlite3.Row
+            # WAL lets the bot and the engine read while the other writes;
+            # NORMAL sync is still crash-safe in WAL mode
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.execute("PRAGMA cache_size = -16000")
+            connections[self.db_name] = conn
+        conn.holders += 1
         return conn
 
+    def close_thread_connection(self):
+        """Really closes the calling thread's connection (e.g. when a worker thread exits)."""
+        conn = _local.__dict__.get('connections', {}).pop(self.db_name, None)
+        if conn is not None:
+            conn.dispose()
+
+    def migrate(self, conn):
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # Each migration, DDL included, runs in one transaction
+            cursor.execute("BEGIN")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+            print(f"✅ Database migrated to version {target}.")
+
     def init_db(self):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -46,28 +217,38 @@ class DatabaseHandler:
         ''')
 
         # Trades table
+        cursor.execute(TRADES_SCHEMA)
+
+        # Signal ids already processed by the engine (see signal_dedup.py)
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            coin_pair TEXT,
-            signal_entry_price TEXT,
-            signal_target_price TEXT,
-            strategy_name TEXT,
-            signal_grade TEXT,
-            buy_order_id TEXT,
-            buy_amount REAL,
-            buy_status TEXT,
-            buy_submit_time TIMESTAMP,
-            sell_order_id TEXT,
-            sell_status TEXT,
-            log_message TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
+        CREATE TABLE IF NOT EXISTS processed_signals (
+            sig_id TEXT PRIMARY KEY,
+            seen_at INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_processed_signals_seen_at ON processed_signals (seen_at)")
+
+        # Version counter bumped by triggers on every change to users; the
+        # engine's signal router rebuilds its index when it moves.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
         )
         ''')
+        cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('users_version', 0)")
+        # Last trade journal entry applied to this database (see trade_journal.py)
+        cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('journal_seq', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS users_version_{event.lower()} AFTER {event} ON users
+            BEGIN
+                UPDATE app_meta SET value = value + 1 WHERE key = 'users_version';
+            END
+            ''')
         
         conn.commit()
+        self.migrate(conn)
         conn.close()
         print(f"✅ Database {self.db_name} ready for Multi-Account support.")
 
@@ -0,0 +1,70 @@
+# exposure_ledger.py
+import threading
+from collections import defaultdict
+
+QUOTE_CURRENCIES = ('USDT', 'TMN')
+
+# A trade keeps capital frozen until it is closed by one of these statuses
+CLOSED_SELL_STATUSES = ('SUCCESSFUL_TRADE', 'STOP_LOSS_FILLED')
+CLOSED_BUY_STATUSES = ('FAILED', 'TIMEOUT_CANCELLED')
+
+
+def quote_currency(symbol):
+    """BTCTMN -> TMN, ETHUSDT -> USDT"""
+    for quote in QUOTE_CURRENCIES:
+        if symbol.endswith(quote):
+            return quote
+    return None
+
+
+class ExposureLedger:
+    """
+    In-memory capital frozen in open trades, per (user_id, quote currency).
+    Rebuilt from the trades table at startup and kept current by the
+    engine and risk manager as trades open and close.
+    """
+
+    def __init__(self):
+        self._exposure = defaultdict(float)  # (user_id, quote) -> frozen amount
+        self._trades = {}                    # trade_id -> (user_id, quote, cost)
+        self._lock = threading.Lock()
+
+    def rebuild(self, conn, shard=None):
+        """Reloads open trades (only those of shard's users, when given) from the database."""
+        shard_sql = shard.sql("user_id") if shard is not None else ""
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, user_id, coin_pair, buy_amount * signal_entry_price AS cost
+            FROM trades
+            WHERE IFNULL(sell_status, '') NOT IN ({",".join("?" * len(CLOSED_SELL_STATUSES))})
+            AND IFNULL(buy_status, '') NOT IN ({",".join("?" * len(CLOSED_BUY_STATUSES))}){shard_sql}
+        ''', CLOSED_SELL_STATUSES + CLOSED_BUY_STATUSES)
+        rows = cursor.fetchall()
+        with self._lock:
+            self._exposure.clear()
+            self._trades.clear()
+        for row in rows:
+            self.open_trade(row['id'], row['user_id'], row['coin_pair'], row['cost'] or 0)
+
+    def open_trade(self, trade_id, user_id, symbol, cost):
+        key = (user_id, quote_currency(symbol))
+        with self._lock:
+            if trade_id in self._trades:
+                return
+            self._trades[trade_id] = (user_id, key[1], cost)
+            self._exposure[key] += cost
+
+    def close_trade(self, trade_id):
+        with self._lock:
+            entry = self._trades.pop(trade_id, None)
+            if entry is None:
+                return
+            user_id, quote, cost = entry
+            key = (user_id, quote)
+            self._exposure[key] -= cost
+            if self._exposure[key] <= 1e-9:
+                del self._exposure[key]
+
+    def get(self, user_id, quote):
+        with self._lock:
+            return self._exposure.get((user_id, quote), 0.0)
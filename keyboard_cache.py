@@ -0,0 +1,133 @@
+# keyboard_cache.py
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from config import KEYBOARD_CACHE_SIZE
+
+COLUMNS = 3
+# کاتالوگ‌های قبلی برای گفتگوهایی که قبل از بروزرسانی شروع شده‌اند نگه داشته می‌شوند
+MAX_CATALOGUES = 3
+
+
+def to_mask(options, selected):
+    """Bitset of the selected options (bit i set when options[i] is selected)."""
+    mask = 0
+    for i, opt in enumerate(options):
+        if opt in selected:
+            mask |= 1 << i
+    return mask
+
+
+def mask_items(items, mask):
+    """Items whose bit is set, in catalogue order."""
+    return [item for i, item in enumerate(items) if mask >> i & 1]
+
+
+class KeyboardCache:
+    """
+    Rendered inline keyboards, keyed by (page, selection bits of that page).
+    Selections are int bitsets, so a toggle is a single XOR and the lookup key
+    is a slice of the bitset. On a miss only the button rows whose bits are
+    not cached yet are built; the Select All / nav / Save rows and every
+    unchanged coin row are reused (buttons are immutable, so sharing is safe).
+
+    Coin keyboards are cached per catalogue tuple: a CoinCatalogue refresh
+    produces a new tuple while older conversations keep theirs, so the last
+    MAX_CATALOGUES tuples each keep their own markups and rows.
+    """
+
+    def __init__(self, max_size=KEYBOARD_CACHE_SIZE):
+        self.max_size = max_size
+        self.markups = OrderedDict()  # simple() keyboards
+        self.catalogues = OrderedDict()  # id(items) -> (items, markups, rows)
+        self.hits = 0
+        self.misses = 0
+
+    def _caches(self, items):
+        key = id(items)
+        entry = self.catalogues.get(key)
+        # The tuple is held in the entry, so its id cannot be reused while cached
+        if entry is None or entry[0] is not items:
+            entry = self.catalogues[key] = (items, OrderedDict(), OrderedDict())
+            if len(self.catalogues) > MAX_CATALOGUES:
+                self.catalogues.popitem(last=False)
+        else:
+            self.catalogues.move_to_end(key)
+        return entry[1], entry[2]
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+    def _row(self, rows, items, prefix, start, end, bits):
+        key = (prefix, start, bits)
+        row = rows.get(key)
+        if row is None:
+            row = tuple(
+                InlineKeyboardButton(f"✅ {items[index]}" if bits >> (index - start) & 1 else items[index],
+                                     callback_data=f"{prefix}_{index}")
+                for index in range(start, end)
+            )
+            self._remember(rows, key, row)
+        else:
+            rows.move_to_end(key)
+        return row
+
+    def paginated(self, items, mask, page=0, items_per_page=15, prefix="COIN"):
+        markups, rows = self._caches(items)
+        start = page * items_per_page
+        end = min(start + items_per_page, len(items))
+        page_bits = (mask >> start) & ((1 << items_per_page) - 1)
+        key = (prefix, page, items_per_page, page_bits)
+        markup = markups.get(key)
+        if markup is not None:
+            markups.move_to_end(key)
+            self.hits += 1
+            return markup
+        self.misses += 1
+
+        keyboard = [[
+            InlineKeyboardButton("Select All", callback_data="ALL_SELECT"),
+            InlineKeyboardButton("Deselect All", callback_data="ALL_DESELECT")
+        ]]
+        for row_start in range(start, end, COLUMNS):
+            row_end = min(row_start + COLUMNS, end)
+            bits = (mask >> row_start) & ((1 << COLUMNS) - 1)
+            keyboard.append(self._row(rows, items, prefix, row_start, row_end, bits))
+        nav_row = []
+        if page > 0:
+            nav_row.append(InlineKeyboardButton("Prev", callback_data="PAGE_PREV"))
+        total_pages = (len(items) + items_per_page - 1) // items_per_page
+        nav_row.append(InlineKeyboardButton(f"Page {page+1}/{total_pages}", callback_data="NOOP"))
+        if start + items_per_page < len(items):
+            nav_row.append(InlineKeyboardButton("Next", callback_data="PAGE_NEXT"))
+        keyboard.append(nav_row)
+        keyboard.append([InlineKeyboardButton("Save Account", callback_data=f"CONFIRM_{prefix}")])
+        markup = InlineKeyboardMarkup(keyboard)
+        self._remember(markups, key, markup)
+        return markup
+
+    def simple(self, options, selected, prefix):
+        options = tuple(options)
+        mask = to_mask(options, selected)
+        key = (prefix, options, mask)
+        markup = self.markups.get(key)
+        if markup is not None:
+            self.markups.move_to_end(key)
+            self.hits += 1
+            return markup
+        self.misses += 1
+
+        keyboard = []
+        row = []
+        for i, opt in enumerate(options):
+            text = f"✅ {opt}" if mask >> i & 1 else opt
+            row.append(InlineKeyboardButton(text, callback_data=f"{prefix}_{opt}"))
+            if len(row) == 2:
+                keyboard.append(row)
+                row = []
+        if row: keyboard.append(row)
+        keyboard.append([InlineKeyboardButton("Confirm", callback_data=f"CONFIRM_{prefix}")])
+        markup = InlineKeyboardMarkup(keyboard)
+        self._remember(self.markups, key, markup)
+        return markup
@@ -0,0 +1,219 @@
+# liquidation.py
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from wallex_client import get_client
+from rate_limiter import request_priority, PRIORITY_STOP_LOSS
+from metrics import registry
+from config import (
+    CHASING_ATTEMPTS, CHASING_DELAY, MAX_CONCURRENT_EXITS, EXIT_DEPTH_TTL, EXIT_FILL_CHECK_DELAY
+)
+
+# وضعیت‌های چرخه فروش اضطراری
+EXIT_QUEUED = 'QUEUED'
+EXIT_CANCEL_TARGET = 'CANCEL_TARGET'    # لغو سفارش فروش هدف
+EXIT_SUBMIT = 'SUBMIT'                  # ارسال سفارش فروش اضطراری
+EXIT_WAIT_FILL = 'WAIT_FILL'            # انتظار برای پر شدن سفارش
+EXIT_REPRICE = 'REPRICE'                # لغو سفارش و گرفتن قیمت جدید
+EXIT_FILLED = 'FILLED'
+EXIT_FAILED = 'FAILED'
+
+
+def sweep_price(bids, quantity):
+    """
+    Price at which a sell of quantity fills completely against bids (best
+    first): the price of the deepest level it reaches. When the book is too
+    thin for the whole quantity, the lowest listed bid.
+    """
+    filled = 0.0
+    for price, size in bids:
+        filled += size
+        if filled >= quantity:
+            return price
+    return bids[-1][0] if bids else None
+
+
+class DepthSnapshots:
+    """
+    Bids per symbol, fetched at most once per ttl however many exits on that
+    symbol ask for them at the same time.
+    """
+
+    def __init__(self, ttl=EXIT_DEPTH_TTL):
+        self.ttl = ttl
+        self._books = {}  # symbol -> (bids, fetched_at)
+        self._symbol_locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def bids(self, symbol):
+        with self._lock:
+            symbol_lock = self._symbol_locks[symbol]
+        # Concurrent callers wait for the first one's fetch instead of repeating it
+        with symbol_lock:
+            entry = self._books.get(symbol)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                return entry[0]
+            book = get_client().get_order_book(symbol)
+            if not book or not book[0]:
+                return None
+            self._books[symbol] = (book[0], time.monotonic())
+            return book[0]
+
+
+class ExitTask:
+    """
+    State machine that drives one position to a filled stop-loss sell. Each
+    attempt is priced against the order book (the price that fills the whole
+    quantity); only without a usable book does it fall back to chasing the
+    last trade price.
+    """
+
+    def __init__(self, trade, initial_price, limit_price=None):
+        self.trade_id = trade.id
+        self.symbol = trade.coin_pair
+        self.quantity = trade.buy_amount
+        self.api_key = trade.wallex_api_key
+        self.target_order_id = trade.sell_order_id
+        self.market_price = initial_price
+        self.limit_price = limit_price  # from the order book; None means chase market_price
+        self.order_id = None
+        self.attempt = 0
+        self.state = EXIT_QUEUED
+
+    def run(self, journal, markets=None, depth=None):
+        client = get_client(self.api_key)
+        self.state = EXIT_CANCEL_TARGET
+        # Every request of an exit (cancel, sell, status, reprice) jumps the rate-limit queue
+        with request_priority(PRIORITY_STOP_LOSS):
+            while self.state not in (EXIT_FILLED, EXIT_FAILED):
+                self.state = self._step(client, journal, markets, depth)
+        return self.state
+
+    def _step(self, client, journal, markets, depth):
+        if self.state == EXIT_CANCEL_TARGET:
+            if self.target_order_id:
+                client.cancel_order(self.target_order_id)
+            return EXIT_SUBMIT
+
+        if self.state == EXIT_SUBMIT:
+            if self.attempt >= CHASING_ATTEMPTS:
+                journal.update_trade(self.trade_id, log_message=f"Stop-loss exit failed after {self.attempt} attempts")
+                return EXIT_FAILED
+            self.attempt += 1
+            if self.limit_price is not None:
+                sell_price = self.limit_price
+            else:
+                # فروش با قیمت کمی پایینتر برای تضمین اجرا
+                sell_price = self.market_price * 0.995
+            order = (self.quantity, sell_price)
+            if markets is not None:
+                order = markets.quantize(self.symbol, "SELL", self.quantity, sell_price, marketable=True)
+                if order is None:
+                    journal.update_trade(self.trade_id, log_message="Stop-loss exit below market minimum size")
+                    return EXIT_FAILED
+            resp = client.place_order(self.symbol, "SELL", "LIMIT", *order)
+            if not resp.get('success'):
+                return EXIT_REPRICE
+            self.order_id = resp['result']['clientOrderId']
+            if resp['result'].get('status') == 'FILLED':
+                # Priced into the book, the order usually fills on arrival; no status round trip needed
+                journal.update_trade(self.trade_id, sell_order_id=self.order_id, sell_status='STOP_LOSS_FILLED')
+                return EXIT_FILLED
+            journal.update_trade(self.trade_id, sell_order_id=self.order_id, sell_status='STOP_LOSS_SUBMITTED')
+            return EXIT_WAIT_FILL
+
+        if self.state == EXIT_WAIT_FILL:
+            time.sleep(EXIT_FILL_CHECK_DELAY if self.limit_price is not None else CHASING_DELAY)
+            status = client.get_order_status(self.order_id)
+            if status.get('success') and status['result']['status'] == 'FILLED':
+                journal.update_trade(self.trade_id, sell_status='STOP_LOSS_FILLED')
+                return EXIT_FILLED
+            client.cancel_order(self.order_id)
+            self.order_id = None
+            return EXIT_REPRICE
+
+        if self.state == EXIT_REPRICE:
+            bids = depth.bids(self.symbol) if depth is not None else None
+            if bids:
+                self.limit_price = sweep_price(bids, self.quantity)
+            else:
+                self.limit_price = None
+                new_p = client.get_last_price(self.symbol)
+                if new_p: self.market_price = new_p
+            return EXIT_SUBMIT
+
+        raise ValueError(f"Unknown exit state {self.state}")
+
+
+class LiquidationPool:
+    """
+    Runs emergency exits as independent tasks on a bounded worker pool so a
+    chase never blocks the main loop. At most MAX_CONCURRENT_EXITS chases
+    run at once; the rest wait in the pool's queue.
+    """
+
+    def __init__(self, journal, max_workers=MAX_CONCURRENT_EXITS, exposure=None, markets=None):
+        self.journal = journal
+        self.markets = markets
+        self.exposure = exposure
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exit")
+        self.depth = DepthSnapshots()
+        self._tasks = {}  # trade_id -> ExitTask
+        self._lock = threading.Lock()
+        registry.add_collector(self._collect_metrics)
+
+    def submit(self, trade, initial_price, limit_price=None):
+        """Queues an exit for trade; returns False if one is already running for it."""
+        with self._lock:
+            if trade.id in self._tasks:
+                return False
+            task = ExitTask(trade, initial_price, limit_price)
+            self._tasks[task.trade_id] = task
+        self.executor.submit(self._run, task)
+        return True
+
+    def submit_group(self, symbol, trades, initial_price):
+        """
+        Queues exits for every triggered trade on one symbol, priced from a
+        single order-book snapshot so that all of them together fill against
+        the current bids. Returns the trades actually queued.
+        """
+        with self._lock:
+            trades = [t for t in trades if t.id not in self._tasks]
+        if not trades:
+            return []
+        with request_priority(PRIORITY_STOP_LOSS):
+            bids = self.depth.bids(symbol)
+        limit_price = sweep_price(bids, sum(t.buy_amount for t in trades)) if bids else None
+        return [t for t in trades if self.submit(t, initial_price, limit_price)]
+
+    def _run(self, task):
+        try:
+            state = task.run(self.journal, self.markets, self.depth)
+            if state == EXIT_FILLED and self.exposure is not None:
+                self.exposure.close_trade(task.trade_id)
+            print(f"🔚 خروج اضطراری {task.symbol} (trade {task.trade_id}): {state}")
+        except Exception as e:
+            print(f"Emergency exit error for trade {task.trade_id}: {e}")
+        finally:
+            with self._lock:
+                self._tasks.pop(task.trade_id, None)
+
+    def states(self):
+        with self._lock:
+            return {trade_id: task.state for trade_id, task in self._tasks.items()}
+
+    def _collect_metrics(self):
+        counts = defaultdict(int)
+        for state in self.states().values():
+            counts[state] += 1
+        return [
+            ("exits_in_progress", "gauge", "Emergency exits queued or running, by state",
+             [({"state": state}, counts[state]) for state in
+              (EXIT_QUEUED, EXIT_CANCEL_TARGET, EXIT_SUBMIT, EXIT_WAIT_FILL, EXIT_REPRICE)]),
+        ]
+
+    def shutdown(self):
+        """Waits for queued and running exits to finish; call before closing the journal."""
+        self.executor.shutdown(wait=True)
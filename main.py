@@ -1,13 +1,39 @@
 # main.py
-import time
+import multiprocessing
+import queue
+import threading
 import requests
-import traceback
 from trading_engine import TradingEngine
 from risk_manager import RiskManager
-from config import SIGNAL_POOL_URL, SIGNAL_CHECK_INTERVAL, RISK_CHECK_INTERVAL, TELEGRAM_BOT_TOKEN, ADMIN_IDS
+from scheduler import Scheduler
+from signal_dedup import SignalDeduplicator
+from signal_feed import SignalFeed
+from sharding import Shard
+from rate_limiter import share_global_limit
+import metrics
+from config import (
+    SIGNAL_CHECK_INTERVAL, ORDER_MONITOR_INTERVAL, RISK_CHECK_INTERVAL,
+    ALERT_FLUSH_INTERVAL, JOB_STATS_INTERVAL, SIGNAL_DEDUP_PRUNE_INTERVAL, JOB_JITTER, TELEGRAM_BOT_TOKEN, ADMIN_IDS,
+    METRICS_HOST, METRICS_PORT, ENGINE_SHARDS, SHARD_SUPERVISE_INTERVAL
+)
+
+# هشدارها در صف قرار می‌گیرند و توسط job جداگانه ارسال می‌شوند
+# تا ارسال پیام تلگرام هیچ‌وقت حلقه‌های ترید را معطل نکند
+_alert_queue = queue.Queue()
 
 def send_admin_alert(message):
     """ارسال پیام اضطراری به ادمین"""
+    _alert_queue.put(message)
+
+def flush_admin_alerts():
+    while True:
+        try:
+            message = _alert_queue.get_nowait()
+        except queue.Empty:
+            return
+        _deliver_admin_alert(message)
+
+def _deliver_admin_alert(message):
     if not TELEGRAM_BOT_TOKEN or not ADMIN_IDS:
         return
         
@@ -25,17 +51,73 @@ def send_admin_alert(message):
     except:
         print("Failed to send admin alert")
 
-def fetch_signals():
+def _on_job_error(job, e):
+    # خطاهای کلی هر job (کرش)
+    send_admin_alert(f"❌ **خطای بحرانی در انجین ({job.name}):**\n`{str(e)}`\nسیستم تا {job.error_delay} ثانیه دیگر مجدد تلاش می‌کند.")
+
+def _on_job_overrun(job, latency):
+    print(f"🐢 Job {job.name} took {latency:.2f}s (deadline {job.deadline}s)")
+
+def _report_job_stats(scheduler, label=""):
+    for name, stats in scheduler.stats().items():
+        print(f"⏱ {label}{name}: runs={stats['runs']} avg={stats['avg_latency']*1000:.0f}ms "
+              f"max={stats['max_latency']*1000:.0f}ms overruns={stats['overruns']} errors={stats['errors']}")
+
+def _process_signal(engine, signal):
+    # برای اطمینان از عدم وقوع خطای پیش‌بینی نشده در پردازش
     try:
-        resp = requests.get(SIGNAL_POOL_URL, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get('status') == 'success' and data.get('count') > 0:
-                return data['data']
+        engine.process_signal(signal)
     except Exception as e:
-        # خطاهای شبکه را فقط پرینت کن، اسپم نکن
-        print(f"Network Error: {e}")
-    return []
+        error_msg = f"خطا در پردازش سیگنال {signal.get('coin')} (trace {signal.get('trace_id')}):\n{str(e)}"
+        print(error_msg)
+        send_admin_alert(error_msg)
+
+def _add_engine_jobs(scheduler, engine, risk_manager):
+    # 2. مانیتورینگ
+    scheduler.add_job("monitor", engine.monitor_orders, ORDER_MONITOR_INTERVAL, jitter=JOB_JITTER)
+    # 3. مدیریت ریسک
+    scheduler.add_job("risk", risk_manager.check_active_stop_losses, RISK_CHECK_INTERVAL, jitter=JOB_JITTER)
+    # 4. ارسال هشدارها
+    scheduler.add_job("alerts", flush_admin_alerts, ALERT_FLUSH_INTERVAL, deadline=10)
+
+def _shutdown_engine(engine, risk_manager):
+    """Drains the exit and order pools, then closes the journal they write to."""
+    # خروج‌های اضطراری در جریان تا پایان (پر شدن یا لغو) ادامه پیدا می‌کنند
+    risk_manager.liquidator.shutdown()
+    engine.dispatcher.shutdown()
+    # تغییرات باقی‌مانده معاملات قبل از خروج در دیتابیس نوشته می‌شوند
+    engine.journal.close()
+
+def _serve_metrics(port):
+    if port:
+        try:
+            metrics.serve(METRICS_HOST, port)
+            print(f"📈 Metrics on http://{METRICS_HOST}:{port}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint disabled: {e}")
+
+def _start_signal_intake(scheduler, on_signal):
+    """Polls (and, if configured, listens to) the signal pool; each new signal goes to on_signal once."""
+    # شناسه سیگنال‌های پردازش شده؛ بعد از ری‌استارت هم باقی می‌ماند
+    processed_signals = SignalDeduplicator()
+    feed = SignalFeed()
+
+    def handle_signal(signal):
+        sig_id = f"{signal['coin']}_{signal['signal_time']}"
+        # قبل از پردازش ثبت می‌شود تا کرش وسط پردازش بعد از ری‌استارت خرید تکراری نسازد
+        if not processed_signals.claim(sig_id):
+            return
+        metrics.start_trace(signal)
+        on_signal(signal)
+
+    def poll_signals():
+        for signal in feed.poll():
+            handle_signal(signal)
+
+    # 1. دریافت سیگنال
+    scheduler.add_job("signals", poll_signals, SIGNAL_CHECK_INTERVAL, jitter=JOB_JITTER)
+    scheduler.add_job("dedup_prune", processed_signals.prune, SIGNAL_DEDUP_PRUNE_INTERVAL)
+    return feed, handle_signal
 
 def main():
     print("🚀 انجین تریدینگ فعال شد...")
@@ -45,50 +127,138 @@ def main():
     db = DatabaseHandler()
     db.init_db()
 
+    if ENGINE_SHARDS > 1:
+        run_coordinator(ENGINE_SHARDS)
+        return
+
     engine = TradingEngine()
-    risk_manager = RiskManager()
-    
-    processed_signals = set()
-    last_risk_check = time.time()
+    risk_manager = RiskManager(engine.journal, engine.positions, exposure=engine.exposure, markets=engine.markets)
+
+    # سیگنال‌ها ممکن است همزمان از Polling و استریم برسند؛ پردازش یکی‌یکی انجام می‌شود
+    signal_lock = threading.Lock()
+
+    def process(signal):
+        with signal_lock:
+            _process_signal(engine, signal)
+
+    scheduler = Scheduler(on_error=_on_job_error, on_overrun=_on_job_overrun)
+    feed, handle_signal = _start_signal_intake(scheduler, process)
+    _add_engine_jobs(scheduler, engine, risk_manager)
+    scheduler.add_job("stats", lambda: _report_job_stats(scheduler), JOB_STATS_INTERVAL)
     
     # ارسال پیام روشن شدن سیستم به ادمین
     send_admin_alert("🚀 سیستم تریدینگ با موفقیت روی سرور روشن شد.")
 
-    while True:
-        try:
-            # 1. دریافت سیگنال
-            signals = fetch_signals()
-            for signal in signals:
-                sig_id = f"{signal['coin']}_{signal['signal_time']}"
-                if sig_id not in processed_signals:
-                    # برای اطمینان از عدم وقوع خطای پیش‌بینی نشده در پردازش
-                    try:
-                        engine.process_signal(signal)
-                    except Exception as e:
-                        error_msg = f"خطا در پردازش سیگنال {signal.get('coin')}:\n{str(e)}"
-                        print(error_msg)
-                        send_admin_alert(error_msg)
-                        
-                    processed_signals.add(sig_id)
-            
-            # 2. مانیتورینگ
-            engine.monitor_orders()
-            
-            # 3. مدیریت ریسک
-            if time.time() - last_risk_check > RISK_CHECK_INTERVAL:
-                risk_manager.check_active_stop_losses()
-                last_risk_check = time.time()
-            
-            time.sleep(SIGNAL_CHECK_INTERVAL)
-            
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            # خطاهای کلی لوپ اصلی (کرش)
-            error_trace = traceback.format_exc()
-            print(f"CRITICAL ERROR: {e}")
-            send_admin_alert(f"❌ **خطای بحرانی در انجین:**\n`{str(e)}`\nسیستم تا 5 ثانیه دیگر مجدد تلاش می‌کند.")
-            time.sleep(5)
+    _serve_metrics(METRICS_PORT)
+
+    listener_stop = feed.start_listener(handle_signal) if feed.push_url else None
+
+    scheduler.run_forever()
+    if listener_stop is not None:
+        listener_stop.set()
+    # run_forever فقط ۱۰ ثانیه منتظر jobها می‌ماند؛ اینجا تا پایان اجرای جاری صبر می‌شود
+    scheduler.stop(timeout=None)
+    # سیگنال در حال پردازش (از استریم) تمام می‌شود و سیگنال بعدی دیگر پردازش نمی‌شود
+    with signal_lock:
+        _shutdown_engine(engine, risk_manager)
+
+def run_worker(shard_index, shard_count, signal_queue, stop_event):
+    """
+    One shard of the sharded runtime: its own TradingEngine, RiskManager,
+    journal and DB connection for the users with id % shard_count ==
+    shard_index. Signals arrive from the coordinator through signal_queue;
+    stop_event asks the shard to finish its current work and exit.
+    """
+    shard = Shard(shard_index, shard_count)
+    label = f"[shard {shard_index}] "
+    # همه شاردها از یک IP درخواست می‌فرستند؛ سقف کلی بین آن‌ها تقسیم می‌شود
+    share_global_limit(1 / shard_count)
+
+    engine = TradingEngine(shard)
+    risk_manager = RiskManager(engine.journal, engine.positions, exposure=engine.exposure, markets=engine.markets)
+
+    scheduler = Scheduler(on_error=_on_job_error, on_overrun=_on_job_overrun)
+    _add_engine_jobs(scheduler, engine, risk_manager)
+    scheduler.add_job("stats", lambda: _report_job_stats(scheduler, label), JOB_STATS_INTERVAL)
+
+    # Ctrl+C فقط همین پروسه را متوقف می‌کند و stop_event مشترک را ست نمی‌کند
+    stopping = threading.Event()
+
+    def consume_signals():
+        while not (stop_event.is_set() or stopping.is_set()):
+            try:
+                signal = signal_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            _process_signal(engine, signal)
+
+    def wait_for_stop():
+        stop_event.wait()
+        scheduler.stop()
+
+    consumer = threading.Thread(target=consume_signals, name="shard-signals", daemon=True)
+    consumer.start()
+    threading.Thread(target=wait_for_stop, name="shard-stop", daemon=True).start()
+    _serve_metrics(METRICS_PORT + 1 + shard_index if METRICS_PORT else None)
+    print(f"{label}started, pid {multiprocessing.current_process().pid}")
+
+    scheduler.run_forever()
+    stopping.set()
+    scheduler.stop(timeout=None)
+    consumer.join()
+    _shutdown_engine(engine, risk_manager)
+
+def run_coordinator(shard_count):
+    """
+    Fetches and de-duplicates signals once, then hands every signal to all
+    shard processes (each one only trades for its own users). A shard that
+    dies is reported and restarted; the others keep running.
+    """
+    # spawn: workers start clean instead of inheriting this process's threads and sockets
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(shard_count)]
+    stop_event = ctx.Event()
+    workers = [None] * shard_count
+
+    def start_worker(index):
+        worker = ctx.Process(target=run_worker, args=(index, shard_count, queues[index], stop_event),
+                             name=f"shard-{index}")
+        worker.start()
+        workers[index] = worker
+
+    for index in range(shard_count):
+        start_worker(index)
+
+    def fan_out(signal):
+        for signal_queue in queues:
+            signal_queue.put(signal)
+
+    def supervise_workers():
+        for index, worker in enumerate(workers):
+            # exitcode 0 is a clean shutdown (e.g. Ctrl+C reaching the whole process group)
+            if not worker.is_alive() and worker.exitcode != 0:
+                send_admin_alert(f"⚠️ شارد {index} با کد {worker.exitcode} متوقف شد و دوباره اجرا می‌شود.")
+                start_worker(index)
+
+    scheduler = Scheduler(on_error=_on_job_error, on_overrun=_on_job_overrun)
+    feed, handle_signal = _start_signal_intake(scheduler, fan_out)
+    scheduler.add_job("supervise", supervise_workers, SHARD_SUPERVISE_INTERVAL)
+    scheduler.add_job("alerts", flush_admin_alerts, ALERT_FLUSH_INTERVAL, deadline=10)
+    scheduler.add_job("stats", lambda: _report_job_stats(scheduler, "[coordinator] "), JOB_STATS_INTERVAL)
+
+    send_admin_alert(f"🚀 سیستم تریدینگ با {shard_count} شارد روی سرور روشن شد.")
+
+    _serve_metrics(METRICS_PORT)
+
+    if feed.push_url:
+        feed.start_listener(handle_signal)
+
+    scheduler.run_forever()
+    stop_event.set()
+    for worker in workers:
+        worker.join(30)
+        if worker.is_alive():
+            worker.terminate()
 
 if __name__ == "__main__":
     main()
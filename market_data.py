@@ -0,0 +1,198 @@
+# market_data.py
+import threading
+import time
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_UP
+from wallex_client import get_client
+from metrics import registry
+from config import PRICE_CACHE_TTL, MARKET_REFRESH_INTERVAL
+
+
+class PriceCache:
+    """
+    TTL cache of last traded prices shared by every open trade.
+    Prices are fetched per symbol, not per trade, so a tick costs one
+    all-markets request plus one request per symbol missing from it.
+    """
+
+    def __init__(self, ttl=PRICE_CACHE_TTL, client=None):
+        self.ttl = ttl
+        self.client = client or get_client()
+        self._prices = {}  # symbol -> (price, fetched_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        registry.add_collector(self._collect_metrics)
+
+    def _is_fresh(self, symbol, now):
+        entry = self._prices.get(symbol)
+        return entry is not None and now - entry[1] < self.ttl
+
+    def refresh(self, symbols):
+        """Makes sure every symbol in symbols has a fresh price."""
+        now = time.monotonic()
+        with self._lock:
+            stale = {s for s in symbols if not self._is_fresh(s, now)}
+        if not stale:
+            return
+
+        fetched = self.client.get_all_last_prices()
+        for symbol in stale - fetched.keys():
+            price = self.client.get_last_price(symbol)
+            if price:
+                fetched[symbol] = price
+
+        now = time.monotonic()
+        with self._lock:
+            for symbol, price in fetched.items():
+                self._prices[symbol] = (price, now)
+            self.fetch_errors += len(stale - fetched.keys())
+
+    def get_many(self, symbols):
+        """Refreshes symbols as needed and returns {symbol: price} for those with a price."""
+        symbols = set(symbols)
+        now = time.monotonic()
+        # Counted before refreshing, so a symbol fetched for this lookup is a miss
+        with self._lock:
+            fresh = {s for s in symbols if self._is_fresh(s, now)}
+            self.hits += len(fresh)
+            self.misses += len(symbols) - len(fresh)
+        self.refresh(symbols - fresh)
+        now = time.monotonic()
+        with self._lock:
+            return {s: self._prices[s][0] for s in symbols if self._is_fresh(s, now)}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            ages = [now - fetched_at for _, fetched_at in self._prices.values()]
+            lookups = self.hits + self.misses
+            return {
+                "symbols": len(self._prices),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "fetch_errors": self.fetch_errors,
+                "max_staleness": max(ages) if ages else 0.0,
+            }
+
+    def _collect_metrics(self):
+        stats = self.stats()
+        return [
+            ("price_cache_hits_total", "counter", "Price lookups answered with a fresh cached price",
+             [({}, stats["hits"])]),
+            ("price_cache_misses_total", "counter", "Price lookups that needed a fetch",
+             [({}, stats["misses"])]),
+            ("price_cache_fetch_errors_total", "counter", "Stale symbols the exchange returned no price for",
+             [({}, stats["fetch_errors"])]),
+            ("price_cache_max_staleness_seconds", "gauge", "Age of the oldest cached price",
+             [({}, stats["max_staleness"])]),
+        ]
+
+
+def _increment(value):
+    """
+    Wallex reports stepSize / tickSize as a number of decimal places
+    (6 -> 0.000001, 0 -> 1); a fractional value is taken as the increment itself.
+    """
+    if value in (None, ''):
+        return None
+    value = Decimal(str(value))
+    if value >= 0 and value == value.to_integral_value():
+        return Decimal(1).scaleb(-int(value))
+    return value if value > 0 else None
+
+
+def _round_to(value, increment, rounding):
+    return ((value / increment).to_integral_value(rounding=rounding) * increment).normalize()
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+class MarketInfo:
+    __slots__ = ("symbol", "base_asset", "quote_asset", "step_size", "tick_size", "min_qty", "min_notional")
+
+    def __init__(self, symbol, market):
+        self.symbol = symbol
+        self.base_asset = market.get('baseAsset')
+        self.quote_asset = market.get('quoteAsset')
+        self.step_size = _increment(market.get('stepSize'))
+        self.tick_size = _increment(market.get('tickSize'))
+        self.min_qty = _decimal(market.get('minQty'))
+        self.min_notional = _decimal(market.get('minNotional'))
+
+
+class MarketCatalog:
+    """
+    symbol -> MarketInfo for every market, loaded once and refreshed in the
+    background, so orders can be rounded to the exchange's precision
+    locally instead of being rejected after a round trip.
+    """
+
+    def __init__(self, client=None, refresh_interval=MARKET_REFRESH_INTERVAL):
+        self.client = client or get_client()
+        self.refresh_interval = refresh_interval
+        self.markets = {}
+        self._stop = threading.Event()
+
+    def load(self):
+        markets = self.client.get_markets()
+        if not markets:
+            return False
+        loaded = {}
+        for symbol, market in markets.items():
+            try:
+                loaded[symbol] = MarketInfo(symbol, market)
+            except (InvalidOperation, ValueError) as e:
+                print(f"Skipping market {symbol}: {e}")
+        # Swapped in one assignment; readers never see a half-built dict
+        self.markets = loaded
+        return True
+
+    def start_refresh(self):
+        self.load()
+        threading.Thread(target=self._refresh_loop, name="market-catalog", daemon=True).start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Market catalog refresh failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self, symbol):
+        return self.markets.get(symbol)
+
+    def quantize(self, symbol, side, quantity, price, marketable=False):
+        """
+        Rounds an order to the market's step and tick size: quantity down,
+        BUY prices down and SELL prices up, so a rounded order never spends
+        more than asked or sells below the requested price by more than a
+        tick. With marketable=True the price is rounded the other way, so an
+        order priced against the book (an emergency exit) still crosses it.
+        Returns (quantity, price) as strings, or None when the rounded
+        order is below the market's minimum quantity or notional. Unknown
+        symbols are passed through unrounded.
+        """
+        quantity = Decimal(str(quantity))
+        price = Decimal(str(price))
+        market = self.markets.get(symbol)
+        if market is None:
+            return format(quantity, 'f'), format(price, 'f')
+
+        if market.step_size:
+            quantity = _round_to(quantity, market.step_size, ROUND_DOWN)
+        if market.tick_size:
+            price = _round_to(price, market.tick_size, ROUND_DOWN if (side == "BUY") != marketable else ROUND_UP)
+
+        if quantity <= 0 or quantity < market.min_qty or quantity * price < market.min_notional:
+            return None
+        return format(quantity, 'f'), format(price, 'f')
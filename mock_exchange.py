@@ -0,0 +1,375 @@
+# mock_exchange.py
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class PricePaths:
+    """Geometric random walk per symbol, stepped by a background thread."""
+
+    def __init__(self, symbols, start_price=100000.0, volatility=0.002, drift=0.0, step=0.5, seed=None):
+        self.rng = random.Random(seed)
+        self.prices = {s: start_price * self.rng.uniform(0.5, 2.0) for s in symbols}
+        self.volatility = volatility
+        self.drift = drift
+        self.step = step
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._loop, name="mock-prices", daemon=True).start()
+
+    def _loop(self):
+        while not self._stop.wait(self.step):
+            with self._lock:
+                for symbol, price in self.prices.items():
+                    self.prices[symbol] = price * math.exp(self.rng.gauss(self.drift, self.volatility))
+
+    def get(self, symbol):
+        with self._lock:
+            return self.prices.get(symbol)
+
+    def stop(self):
+        self._stop.set()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+
+class MockExchange:
+    """
+    Local stand-in for the Wallex endpoints WallexClient and AsyncWallexClient
+    call. Every request waits `latency` seconds (plus up to `jitter`), orders
+    live in memory, and a resting order fills once the price path crosses its
+    limit or, failing that, with `fill_probability` each time it is looked at.
+    With `key_rate_limit` set, an API key sending more requests than that in
+    one second gets HTTP 429 with Retry-After. Every order is recorded with
+    its arrival time for the benchmark.
+    """
+
+    def __init__(self, symbols, latency=0.02, jitter=0.01, fill_probability=0.3,
+                 volatility=0.002, key_rate_limit=None, seed=None, host="127.0.0.1", port=0):
+        self.symbols = list(symbols)
+        self.latency = latency
+        self.jitter = jitter
+        self.fill_probability = fill_probability
+        self.key_rate_limit = key_rate_limit
+        self._windows = {}  # api key -> (second, requests in it)
+        self.rejected = 0
+        self.rng = random.Random(seed)
+        self.prices = PricePaths(self.symbols, volatility=volatility, seed=seed)
+        self.orders = {}  # clientOrderId -> order dict
+        self.order_log = []  # (arrival time, api key, symbol, side)
+        self.requests = {}  # endpoint -> count
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.prices.start()
+        threading.Thread(target=self.server.serve_forever, name="mock-exchange", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.prices.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _market(self, symbol):
+        quote = "USDT" if symbol.endswith("USDT") else "TMN"
+        return {
+            "symbol": symbol,
+            "baseAsset": symbol[:-len(quote)],
+            "quoteAsset": quote,
+            "stepSize": 6,
+            "tickSize": 2 if quote == "USDT" else 0,
+            "minQty": "0",
+            "minNotional": "0",
+            "stats": {"lastPrice": str(self.prices.get(symbol))},
+        }
+
+    def _depth(self, symbol, levels=20, level_quantity=50.0):
+        price = self.prices.get(symbol)
+        bids = [{"price": str(price * (1 - 0.001 * (i + 1))), "quantity": str(level_quantity)} for i in range(levels)]
+        asks = [{"price": str(price * (1 + 0.001 * (i + 1))), "quantity": str(level_quantity)} for i in range(levels)]
+        return {"bid": bids, "ask": asks}
+
+    def _crossed(self, order):
+        price = self.prices.get(order["symbol"])
+        limit = float(order["price"]) if order["price"] else None
+        return limit is None or (limit >= price if order["side"] == "BUY" else limit <= price)
+
+    def _maybe_fill(self, order, probability=None):
+        if order["status"] != "NEW":
+            return
+        probability = self.fill_probability if probability is None else probability
+        if self._crossed(order) or self.rng.random() < probability:
+            order["status"] = "FILLED"
+            order["executedQty"] = order["origQty"]
+
+    def _handler(self):
+        exchange = self
+
+        class Handler(_JSONHandler):
+            def _route(self, method):
+                path = urlparse(self.path).path
+                endpoint = f"{method} {path.rsplit('/', 1)[0] + '/{id}' if path.startswith('/v1/account/orders/') else path}"
+                api_key = self.headers.get("X-API-Key")
+                # Read the body up front so a 429 leaves the keep-alive connection usable
+                self.payload = self._body()
+                with exchange._lock:
+                    exchange.requests[endpoint] = exchange.requests.get(endpoint, 0) + 1
+                    limited = False
+                    if exchange.key_rate_limit and api_key:
+                        second = int(time.time())
+                        window, count = exchange._windows.get(api_key, (second, 0))
+                        count = count + 1 if window == second else 1
+                        exchange._windows[api_key] = (second, count)
+                        if count > exchange.key_rate_limit:
+                            exchange.rejected += 1
+                            limited = True
+                time.sleep(exchange.latency + exchange.rng.uniform(0, exchange.jitter))
+                if limited:
+                    self._send(429, {"success": False, "message": "Too many requests"}, {"Retry-After": "1"})
+                    return None
+                return path
+
+            def do_GET(self):
+                path = self._route("GET")
+                if path is None:
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                api_key = self.headers.get("X-API-Key")
+                if path == "/hector/web/v1/markets":
+                    markets = [{"symbol": s, "base_asset": exchange._market(s)["baseAsset"],
+                                "quote_asset": exchange._market(s)["quoteAsset"]} for s in exchange.symbols]
+                    return self._send(200, {"success": True, "result": {"markets": markets}})
+                if path == "/v1/markets":
+                    symbols = {s: exchange._market(s) for s in exchange.symbols}
+                    return self._send(200, {"success": True, "result": {"symbols": symbols}})
+                if path == "/v1/trades":
+                    symbol = query.get("symbol", [""])[0]
+                    price = exchange.prices.get(symbol)
+                    if price is None:
+                        return self._send(404, {"success": False, "message": "Unknown symbol"})
+                    trade = {"symbol": symbol, "price": str(price), "quantity": "1", "timestamp": datetime.utcnow().isoformat()}
+                    return self._send(200, {"success": True, "result": {"latestTrades": [trade]}})
+                if path == "/v1/depth":
+                    symbol = query.get("symbol", [""])[0]
+                    if symbol not in exchange.prices.prices:
+                        return self._send(400, {"success": False, "message": "Invalid symbol"})
+                    return self._send(200, {"success": True, "result": exchange._depth(symbol)})
+                if path == "/v1/account/balances":
+                    return self._send(200, {"success": True, "result": {"balances": {}}})
+                if path == "/v1/account/openOrders":
+                    symbol = query.get("symbol", [None])[0]
+                    with exchange._lock:
+                        orders = [o for o in exchange.orders.values() if o["apiKey"] == api_key]
+                        for order in orders:
+                            exchange._maybe_fill(order)
+                        open_orders = [dict(o) for o in orders
+                                       if o["status"] == "NEW" and (symbol is None or o["symbol"] == symbol)]
+                    return self._send(200, {"success": True, "result": {"orders": open_orders}})
+                if path.startswith("/v1/account/orders/"):
+                    with exchange._lock:
+                        order = exchange.orders.get(path.rsplit("/", 1)[1])
+                        if order is not None:
+                            exchange._maybe_fill(order)
+                            order = dict(order)
+                    if order is None:
+                        return self._send(404, {"success": False, "message": "Order not found"})
+                    return self._send(200, {"success": True, "result": order})
+                self._send(404, {"success": False, "message": "Not found"})
+
+            def do_POST(self):
+                path = self._route("POST")
+                if path is None:
+                    return
+                if path != "/v1/account/orders":
+                    return self._send(404, {"success": False, "message": "Not found"})
+                payload = self.payload
+                if payload.get("symbol") not in exchange.prices.prices:
+                    return self._send(400, {"success": False, "message": "Invalid symbol"})
+                order = {
+                    "clientOrderId": uuid.uuid4().hex,
+                    "apiKey": self.headers.get("X-API-Key"),
+                    "symbol": payload["symbol"],
+                    "side": payload.get("side"),
+                    "type": payload.get("type"),
+                    "price": payload.get("price"),
+                    "origQty": payload.get("quantity"),
+                    "executedQty": "0",
+                    "status": "NEW",
+                }
+                with exchange._lock:
+                    # A marketable order fills on arrival
+                    exchange._maybe_fill(order, probability=0)
+                    exchange.orders[order["clientOrderId"]] = order
+                    exchange.order_log.append((time.time(), order["apiKey"], order["symbol"], order["side"]))
+                self._send(200, {"success": True, "result": dict(order)})
+
+            def do_DELETE(self):
+                path = self._route("DELETE")
+                if path is None:
+                    return
+                with exchange._lock:
+                    order = exchange.orders.get(path.rsplit("/", 1)[1])
+                    if order is not None and order["status"] == "NEW":
+                        order["status"] = "CANCELED"
+                self._send(200, {"success": order is not None, "result": dict(order) if order else None})
+
+        return Handler
+
+
+class MockSignalPool:
+    """
+    Local stand-in for SIGNAL_POOL_URL. Publishes `signals_per_minute`
+    signals at evenly spaced times, priced off the exchange's price paths,
+    and answers polls in the pool's {"status", "count", "data"} shape with
+    ETag / 304 and ?since= support. stream_url is the push endpoint
+    SignalFeed.listen() reads: newline-delimited JSON, starting after
+    ?since=, with a blank keep-alive line when idle; with `stream_reset_after`
+    the server drops each stream after that many signals to force a
+    reconnect. Publish times are kept per signal so the benchmark can
+    measure signal-to-order latency.
+    """
+
+    def __init__(self, exchange, coins, pair="TMN", signals_per_minute=100, strategies=("Internal",),
+                 grades=("Q1",), seed=None, stream_reset_after=None, host="127.0.0.1", port=0):
+        self.exchange = exchange
+        self.coins = list(coins)
+        self.pair = pair
+        self.interval = 60.0 / signals_per_minute
+        self.strategies = strategies
+        self.grades = grades
+        self.rng = random.Random(seed)
+        self.signals = []
+        self.published = []  # (publish time, symbol)
+        self.stream_reset_after = stream_reset_after
+        self.streams = 0    # stream connections opened
+        self.streamed = 0   # signals written to streams
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/signal_pool"
+
+    @property
+    def stream_url(self):
+        return self.url + "/stream"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="mock-signal-pool", daemon=True).start()
+        threading.Thread(target=self._publish_loop, name="mock-signal-publisher", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._published:
+            self._published.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _publish_loop(self):
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            coin = self.rng.choice(self.coins)
+            symbol = f"{coin}{self.pair}"
+            price = self.exchange.prices.get(symbol)
+            now = time.time()
+            signal = {
+                "coin": coin,
+                "pair": self.pair,
+                "strategy_name": self.rng.choice(self.strategies),
+                "signal_grade": self.rng.choice(self.grades),
+                "entry_price": price,
+                "target_price": price * 1.02,
+                "signal_time": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            }
+            with self._published:
+                self.signals.append(signal)
+                self.published.append((now, symbol))
+                self._published.notify_all()
+            next_at += self.interval
+            self._stop.wait(max(0.0, next_at - time.monotonic()))
+
+    def _handler(self):
+        pool = self
+
+        class Handler(_JSONHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                since = parse_qs(url.query).get("since", [None])[0]
+                if url.path.endswith("/stream"):
+                    return self._stream(since)
+                with pool._lock:
+                    etag = f'"{len(pool.signals)}"'
+                    signals = [s for s in pool.signals if since is None or s["signal_time"] > since]
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, None, {"ETag": etag})
+                self._send(200, {"status": "success", "count": len(signals), "data": signals}, {"ETag": etag})
+
+            def _stream(self, since):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                with pool._lock:
+                    pool.streams += 1
+                    # signal_time grows with publish order
+                    position = sum(1 for s in pool.signals if since is not None and s["signal_time"] <= since)
+                sent = 0
+                try:
+                    while not pool._stop.is_set():
+                        with pool._published:
+                            if position >= len(pool.signals):
+                                pool._published.wait(5)
+                            batch = pool.signals[position:]
+                            if pool.stream_reset_after:
+                                batch = batch[:pool.stream_reset_after - sent]
+                            position += len(batch)
+                            pool.streamed += len(batch)
+                        self.wfile.write(b"".join(json.dumps(s).encode() + b"\n" for s in batch) or b"\n")
+                        self.wfile.flush()
+                        sent += len(batch)
+                        if pool.stream_reset_after and sent >= pool.stream_reset_after:
+                            return
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
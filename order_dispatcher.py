@@ -0,0 +1,31 @@
+# order_dispatcher.py
+from concurrent.futures import ThreadPoolExecutor
+from config import ORDER_DISPATCH_WORKERS
+
+
+class OrderDispatcher:
+    """
+    Sends one signal's orders for many users in parallel over a bounded
+    thread pool. Pacing per API key and overall is done by the shared
+    RequestScheduler inside WallexClient.
+    """
+
+    def __init__(self, max_workers=ORDER_DISPATCH_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="order")
+
+    def dispatch(self, users, func):
+        """
+        Runs func(user) for every user concurrently and returns a list of
+        (user, result) pairs in the same order as users.
+        """
+        futures = [(user, self.executor.submit(func, user)) for user in users]
+        results = []
+        for user, future in futures:
+            try:
+                results.append((user, future.result()))
+            except Exception as e:
+                results.append((user, {"success": False, "message": str(e)}))
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,72 @@
+# order_monitor.py
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from wallex_client import get_client
+from config import MONITOR_WORKERS, MONITOR_MAX_BACKOFF
+
+
+class OrderStatusPoller:
+    """
+    Fetches the status of many submitted orders with as few exchange calls
+    as possible: one open-orders call per API key, and a per-order lookup
+    only for orders that have left the open list (filled or cancelled).
+    Accounts are polled concurrently on a bounded pool.
+
+    Orders whose status keeps coming back unchanged are polled less often,
+    doubling up to MONITOR_MAX_BACKOFF seconds, but never past their deadline.
+    """
+
+    def __init__(self, max_workers=MONITOR_WORKERS, max_backoff=MONITOR_MAX_BACKOFF):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="monitor")
+        self.max_backoff = max_backoff
+        self._schedule = {}  # trade_id -> (next_poll_at, interval, last_status)
+
+    def due(self, trades):
+        """Filters trades to those whose next poll time has come and forgets closed ones."""
+        live_ids = {trade.id for trade in trades}
+        for trade_id in self._schedule.keys() - live_ids:
+            del self._schedule[trade_id]
+        now = time.monotonic()
+        return [t for t in trades if self._schedule.get(t.id, (0,))[0] <= now]
+
+    def fetch(self, trades):
+        """Returns {trade_id: exchange status} for trades; failed lookups are left out."""
+        by_key = defaultdict(list)
+        for trade in trades:
+            by_key[trade.wallex_api_key].append(trade)
+        statuses = {}
+        for result in self.executor.map(lambda item: self._fetch_account(*item), by_key.items()):
+            statuses.update(result)
+        return statuses
+
+    def _fetch_account(self, api_key, trades):
+        client = get_client(api_key)
+        statuses = {}
+        open_orders = client.get_open_orders()
+        if open_orders is not None:
+            open_status = {o['clientOrderId']: o['status'] for o in open_orders}
+        else:
+            open_status = {}
+        for trade in trades:
+            status = open_status.get(trade.buy_order_id)
+            if status is None:
+                resp = client.get_order_status(trade.buy_order_id)
+                if not resp.get('success'):
+                    continue
+                status = resp['result']['status']
+            statuses[trade.id] = status
+        return statuses
+
+    def reschedule(self, trade_id, status, deadline):
+        """
+        Backs off polling of trade_id while status stays the same. deadline
+        is the monotonic time by which it must be polled again regardless.
+        """
+        _, interval, last_status = self._schedule.get(trade_id, (0, 0, None))
+        if status == last_status:
+            interval = min(max(interval * 2, 1), self.max_backoff)
+        else:
+            interval = 0
+        next_poll = min(time.monotonic() + interval, deadline)
+        self._schedule[trade_id] = (next_poll, interval, status)
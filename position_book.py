@@ -0,0 +1,183 @@
+# position_book.py
+import threading
+from exposure_ledger import CLOSED_SELL_STATUSES, CLOSED_BUY_STATUSES
+from sharding import SINGLE
+
+# وضعیت‌هایی که حلقه‌های مانیتور و ریسک روی آن‌ها کار می‌کنند
+WATCHED_BUY_STATUSES = ('BUY_SUBMITTED',)
+WATCHED_SELL_STATUSES = ('SUBMITTED', 'PENDING')
+
+
+class Position:
+    """One open trade plus the owner's fields the loops need, as plain attributes."""
+
+    __slots__ = (
+        "id", "user_id", "coin_pair", "signal_entry_price", "signal_target_price",
+        "buy_order_id", "buy_amount", "buy_status", "buy_submit_time",
+        "sell_order_id", "sell_status",
+        "wallex_api_key", "stop_loss_percent", "full_name",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @property
+    def is_watched(self):
+        if self.buy_status in CLOSED_BUY_STATUSES or self.sell_status in CLOSED_SELL_STATUSES:
+            return False
+        return self.buy_status in WATCHED_BUY_STATUSES or self.sell_status in WATCHED_SELL_STATUSES
+
+
+TRADE_FIELDS = tuple(name for name in Position.__slots__ if name not in ("wallex_api_key", "stop_loss_percent", "full_name"))
+
+
+class PositionBook:
+    """
+    Authoritative in-memory set of the positions the monitor and risk loops
+    act on, indexed by buy status, sell status, symbol and user. Loaded once
+    from SQLite at startup; after that the engine adds each new trade with
+    open() and TradeJournal passes every later change through update() as
+    it logs it, so the loops read memory while the journal writes the same
+    changes behind to SQLite.
+
+    A position leaves the book once neither its buy nor its sell is in a
+    watched state. Owner fields (API key, stop-loss percent, name) are
+    reloaded when users_version changes; positions whose owner was deleted
+    are dropped, as the old JOIN on users did.
+    """
+
+    def __init__(self, shard=SINGLE):
+        self.shard = shard
+        self.users_version = None
+        self._positions = {}        # trade_id -> Position
+        self._by_buy_status = {}    # status -> {trade_id}
+        self._by_sell_status = {}   # status -> {trade_id}
+        self._by_symbol = {}        # symbol -> {trade_id}
+        self._by_user = {}          # user_id -> {trade_id}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    @staticmethod
+    def _index_add(index, key, trade_id):
+        ids = index.get(key)
+        if ids is None:
+            ids = index[key] = set()
+        ids.add(trade_id)
+
+    @staticmethod
+    def _index_remove(index, key, trade_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(trade_id)
+            if not ids:
+                del index[key]
+
+    def _link(self, position):
+        self._index_add(self._by_buy_status, position.buy_status, position.id)
+        self._index_add(self._by_sell_status, position.sell_status, position.id)
+        self._index_add(self._by_symbol, position.coin_pair, position.id)
+        self._index_add(self._by_user, position.user_id, position.id)
+
+    def _unlink(self, position):
+        self._index_remove(self._by_buy_status, position.buy_status, position.id)
+        self._index_remove(self._by_sell_status, position.sell_status, position.id)
+        self._index_remove(self._by_symbol, position.coin_pair, position.id)
+        self._index_remove(self._by_user, position.user_id, position.id)
+
+    def load(self, conn):
+        """Fills the book from the trades table; call after the journal has replayed."""
+        columns = ", ".join(f"t.{name}" for name in TRADE_FIELDS)
+        rows = conn.execute(f'''
+            SELECT {columns}, u.wallex_api_key, u.stop_loss_percent, u.full_name
+            FROM trades t
+            JOIN users u ON t.user_id = u.id
+            WHERE (t.buy_status IN ({",".join("?" * len(WATCHED_BUY_STATUSES))})
+                   OR t.sell_status IN ({",".join("?" * len(WATCHED_SELL_STATUSES))}))
+        ''' + self.shard.sql("t.user_id"), WATCHED_BUY_STATUSES + WATCHED_SELL_STATUSES).fetchall()
+        self.users_version = conn.execute("SELECT value FROM app_meta WHERE key = 'users_version'").fetchone()[0]
+        with self._lock:
+            self._positions.clear()
+            for index in (self._by_buy_status, self._by_sell_status, self._by_symbol, self._by_user):
+                index.clear()
+            for row in rows:
+                position = Position(**{key: row[key] for key in row.keys()})
+                if position.is_watched:
+                    self._positions[position.id] = position
+                    self._link(position)
+        return len(self._positions)
+
+    def open(self, trade_id, user, **fields):
+        """Adds a newly inserted trade, taking the owner fields from its users row."""
+        position = Position(id=trade_id, wallex_api_key=user['wallex_api_key'],
+                            stop_loss_percent=user['stop_loss_percent'], full_name=user['full_name'], **fields)
+        with self._lock:
+            if position.is_watched:
+                self._positions[trade_id] = position
+                self._link(position)
+
+    def update(self, trade_id, fields):
+        """Applies a trade change; called by TradeJournal for every update it logs."""
+        with self._lock:
+            position = self._positions.get(trade_id)
+            if position is None:
+                return
+            self._unlink(position)
+            for name, value in fields.items():
+                if name in TRADE_FIELDS:
+                    setattr(position, name, value)
+            if position.is_watched:
+                self._link(position)
+            else:
+                del self._positions[trade_id]
+
+    def sync_users(self, conn):
+        """Reloads owner fields if the users table changed since the last look."""
+        version = conn.execute("SELECT value FROM app_meta WHERE key = 'users_version'").fetchone()[0]
+        if version == self.users_version:
+            return
+        with self._lock:
+            user_ids = list(self._by_user)
+        users = {}
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            for row in conn.execute(
+                f"SELECT id, wallex_api_key, stop_loss_percent, full_name FROM users WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ):
+                users[row['id']] = row
+        with self._lock:
+            # Only users looked up above; positions opened meanwhile already carry fresh fields
+            for user_id in user_ids:
+                user = users.get(user_id)
+                for trade_id in list(self._by_user.get(user_id, ())):
+                    position = self._positions[trade_id]
+                    if user is None:
+                        self._unlink(position)
+                        del self._positions[trade_id]
+                        continue
+                    position.wallex_api_key = user['wallex_api_key']
+                    position.stop_loss_percent = user['stop_loss_percent']
+                    position.full_name = user['full_name']
+        self.users_version = version
+
+    def _select(self, index, keys):
+        with self._lock:
+            return [self._positions[trade_id] for key in keys for trade_id in index.get(key, ())]
+
+    def with_buy_status(self, *statuses):
+        return self._select(self._by_buy_status, statuses)
+
+    def with_sell_status(self, *statuses):
+        return self._select(self._by_sell_status, statuses)
+
+    def for_symbol(self, symbol):
+        return self._select(self._by_symbol, (symbol,))
+
+    def for_user(self, user_id):
+        return self._select(self._by_user, (user_id,))
+
+    def get(self, trade_id):
+        return self._positions.get(trade_id)
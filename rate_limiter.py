@@ -0,0 +1,208 @@
+# rate_limiter.py
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from metrics import registry
+from config import (
+    WALLEX_GLOBAL_RATE, WALLEX_GLOBAL_BURST, WALLEX_KEY_RATE, WALLEX_KEY_BURST,
+    RATE_LIMIT_DEFAULT_BACKOFF, RATE_LIMIT_RESERVE, RATE_LIMIT_LOW_SHARE, CLIENT_CACHE_SIZE
+)
+
+# اولویت درخواست‌ها به والکس؛ عدد کمتر زودتر ارسال می‌شود
+PRIORITY_STOP_LOSS = 0
+PRIORITY_MANAGE = 1     # سفارش فروش هدف و لغو خریدهای تایم‌اوت شده
+PRIORITY_ORDER = 2      # خریدهای جدید
+PRIORITY_POLL = 3
+PRIORITY_PRICE = 4
+
+PRIORITY_NAMES = {PRIORITY_STOP_LOSS: "stop_loss", PRIORITY_MANAGE: "manage", PRIORITY_ORDER: "order",
+                  PRIORITY_POLL: "poll", PRIORITY_PRICE: "price"}
+
+WAIT_SECONDS = registry.histogram(
+    "rate_limit_wait_seconds", "Time requests spent queued for a rate-limit token", ("priority",))
+RATE_LIMITED_TOTAL = registry.counter("rate_limited_total", "HTTP 429 responses received from Wallex")
+
+_local = threading.local()
+
+
+@contextmanager
+def request_priority(priority):
+    """Raises (or lowers) the priority of every Wallex request made by this thread inside the block."""
+    previous = getattr(_local, 'priority', None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority(default):
+    priority = getattr(_local, 'priority', None)
+    return default if priority is None else priority
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self):
+        """Seconds until the next whole token, as of the last refill."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def block(self, seconds):
+        """Makes the next token available only after `seconds` (a server-side Retry-After)."""
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class RequestScheduler:
+    """
+    Admits Wallex requests through a global token bucket and one bucket per
+    API key. Callers block in acquire() until both have a token; waiting
+    requests are admitted in priority order (stop-loss exits, then target
+    sells and cancels of open positions, then new orders, then status
+    polls, then price refreshes), but a request whose own key is
+    exhausted does not hold up requests for other keys. Nothing is dropped:
+    a burst is spread out at exactly the configured rate.
+
+    Two rules keep an order fan-out from starving everything else. The
+    last `reserve` global tokens can only go to stop-loss requests (exits
+    and their price refresh) and to target sells and cancels, so those
+    never queue behind a burst. And while status polls or price refreshes
+    are waiting, at least `low_share` of the tokens handed out among
+    orders, polls and prices go to them (oldest first), ahead of orders.
+    """
+
+    def __init__(self, global_rate=WALLEX_GLOBAL_RATE, global_burst=WALLEX_GLOBAL_BURST,
+                 key_rate=WALLEX_KEY_RATE, key_burst=WALLEX_KEY_BURST, max_keys=CLIENT_CACHE_SIZE,
+                 reserve=RATE_LIMIT_RESERVE, low_share=RATE_LIMIT_LOW_SHARE):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.max_keys = max_keys
+        self.reserve = reserve
+        self.low_share = low_share
+        self._low_credit = 0.0  # tokens owed to polls and price refreshes
+        self._key_buckets = {}
+        self._waiting = []  # [priority, seq, api_key, granted]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _key_bucket(self, api_key, now):
+        bucket = self._key_buckets.get(api_key)
+        if bucket is None:
+            if len(self._key_buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self._key_buckets[api_key] = TokenBucket(self.key_rate, self.key_burst)
+        bucket.refill(now)
+        return bucket
+
+    def _prune(self, now):
+        # A full bucket carries no state worth keeping
+        for key, bucket in list(self._key_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._key_buckets[key]
+
+    def _grant(self):
+        """Hands tokens to waiters in priority order; returns seconds until one could be granted next."""
+        now = time.monotonic()
+        bucket = self.global_bucket
+        bucket.refill(now)
+        # A reserve as large as the bucket would shut everything else out
+        reserve = min(self.reserve, bucket.capacity - 1)
+        waiting = sorted(self._waiting)
+        low = [t for t in waiting if t[0] > PRIORITY_ORDER]
+        if not low:
+            self._low_credit = 0.0
+        # The oldest polls / price refreshes the credit pays for go just ahead of orders
+        promoted = {id(t) for t in low[:int(self._low_credit)]}
+        waiting.sort(key=lambda t: (PRIORITY_ORDER - 0.5 if id(t) in promoted else t[0], t[1]))
+        next_delay = None
+        granted = False
+        for ticket in waiting:
+            if bucket.tokens < 1:
+                delay = bucket.delay()
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+                break
+            if ticket[0] >= PRIORITY_ORDER and bucket.tokens < 1 + reserve:
+                delay = (1 + reserve - bucket.tokens) / bucket.rate
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+                continue
+            api_key = ticket[2]
+            key_bucket = self._key_bucket(api_key, now) if api_key else None
+            if key_bucket is not None and key_bucket.tokens < 1:
+                delay = key_bucket.delay()
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+                continue
+            if key_bucket is not None:
+                key_bucket.tokens -= 1
+            bucket.tokens -= 1
+            if id(ticket) in promoted:
+                self._low_credit -= 1
+            elif ticket[0] == PRIORITY_ORDER and low and self.low_share < 1:
+                # low_share of orders + low grants: one low token per (1 - share) / share orders
+                self._low_credit = min(self._low_credit + self.low_share / (1 - self.low_share), len(low))
+            ticket[3] = True
+            self._waiting.remove(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+        return next_delay
+
+    def acquire(self, api_key, priority):
+        started = time.monotonic()
+        with self._cond:
+            ticket = [priority, next(self._seq), api_key, False]
+            self._waiting.append(ticket)
+            while True:
+                delay = self._grant()
+                if ticket[3]:
+                    break
+                self._cond.wait(delay)
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    def penalize(self, api_key, retry_after=None):
+        """
+        Called on HTTP 429: holds back the key's bucket (or the global one
+        for unauthenticated requests) for retry_after seconds.
+        """
+        RATE_LIMITED_TOTAL.inc()
+        seconds = retry_after if retry_after is not None else RATE_LIMIT_DEFAULT_BACKOFF
+        with self._cond:
+            now = time.monotonic()
+            bucket = self._key_bucket(api_key, now) if api_key else self.global_bucket
+            bucket.refill(now)
+            bucket.block(seconds)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def share_global_limit(fraction):
+    """Scales this process's global bucket when several processes share one IP (sharded engine)."""
+    scheduler = get_request_scheduler()
+    with scheduler._cond:
+        bucket = scheduler.global_bucket
+        bucket.rate *= fraction
+        bucket.capacity = max(1, bucket.capacity * fraction)
+        bucket.tokens = min(bucket.tokens, bucket.capacity)
+        scheduler.reserve *= fraction
+
+def get_request_scheduler():
+    """Process-wide scheduler shared by every WallexClient."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
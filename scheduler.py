@@ -0,0 +1,129 @@
+# scheduler.py
+import random
+import threading
+import time
+import traceback
+from metrics import registry
+
+JOB_SECONDS = registry.histogram("job_run_seconds", "Duration of each scheduler job run", ("job",))
+
+
+class Job:
+    """A periodic task with its own cadence, deadline and latency statistics."""
+
+    def __init__(self, name, func, interval, deadline=None, jitter=0.0, error_delay=5):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.deadline = deadline if deadline is not None else interval
+        self.jitter = jitter
+        self.error_delay = error_delay
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record(self, latency):
+        self.runs += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "overruns": self.overruns,
+            "last_latency": self.last_latency,
+            "avg_latency": self.total_latency / self.runs if self.runs else 0.0,
+            "max_latency": self.max_latency,
+        }
+
+
+class Scheduler:
+    """
+    Runs each job on its own thread so a slow job (e.g. a hanging exchange
+    call) only delays itself. A run that takes longer than the job's
+    deadline is reported through on_overrun; an exception through on_error,
+    after which the job waits error_delay seconds before its next run.
+    """
+
+    def __init__(self, on_error=None, on_overrun=None):
+        self.jobs = {}
+        self.on_error = on_error
+        self.on_overrun = on_overrun
+        self._stop = threading.Event()
+        self._threads = []
+        registry.add_collector(self._collect_metrics)
+
+    def add_job(self, name, func, interval, deadline=None, jitter=0.0, error_delay=5):
+        job = Job(name, func, interval, deadline, jitter, error_delay)
+        self.jobs[name] = job
+        return job
+
+    def _run_job(self, job):
+        next_run = time.monotonic()
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                job.func()
+            except Exception as e:
+                job.errors += 1
+                print(f"Job {job.name} failed: {e}\n{traceback.format_exc()}")
+                if self.on_error:
+                    self.on_error(job, e)
+                next_run = time.monotonic() + job.error_delay
+            else:
+                next_run += job.interval + random.uniform(0, job.jitter)
+            latency = time.monotonic() - started
+            job.record(latency)
+            JOB_SECONDS.observe(latency, job=job.name)
+
+            if latency > job.deadline:
+                job.overruns += 1
+                if self.on_overrun:
+                    self.on_overrun(job, latency)
+
+            # Do not try to catch up on runs missed during an overrun
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            self._stop.wait(next_run - now)
+
+    def start(self):
+        for job in self.jobs.values():
+            thread = threading.Thread(target=self._run_job, args=(job,), name=f"job-{job.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def run_forever(self):
+        """Starts every job and blocks until stop() is called or Ctrl+C."""
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    def _collect_metrics(self):
+        stats = self.stats()
+        return [
+            ("job_errors_total", "counter", "Scheduler job runs that raised",
+             [({"job": name}, s["errors"]) for name, s in stats.items()]),
+            ("job_overruns_total", "counter", "Scheduler job runs that exceeded their deadline",
+             [({"job": name}, s["overruns"]) for name, s in stats.items()]),
+            ("job_last_run_seconds", "gauge", "Duration of each job's latest run",
+             [({"job": name}, s["last_latency"]) for name, s in stats.items()]),
+        ]
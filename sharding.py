@@ -0,0 +1,50 @@
+# sharding.py
+
+
+class Shard:
+    """
+    One hash partition of users by id: the shard owns every user with
+    id % count == index, together with their trades. Shard(0, 1), the
+    default, owns everything and is the single-process engine.
+
+    Trade ids are striped the same way, (id - 1) % count == index, so
+    journals in different processes never hand out the same id.
+    """
+
+    def __init__(self, index=0, count=1):
+        if not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @property
+    def sharded(self):
+        return self.count > 1
+
+    def owns(self, user_id):
+        return user_id % self.count == self.index
+
+    def sql(self, column):
+        """SQL condition (with leading AND) restricting column, a users.id, to this shard."""
+        if not self.sharded:
+            return ""
+        return f" AND {column} % {int(self.count)} = {int(self.index)}"
+
+    def journal_path(self, path):
+        return f"{path}.{self.index}" if self.sharded else path
+
+    @property
+    def journal_key(self):
+        """app_meta key holding the last journal sequence number applied for this shard."""
+        return f"journal_seq_{self.index}" if self.sharded else "journal_seq"
+
+    def first_trade_id(self, max_id):
+        """Smallest id of this shard's stripe above max_id."""
+        candidate = (max_id or 0) + 1
+        return candidate + (self.index - (candidate - 1)) % self.count
+
+    def __repr__(self):
+        return f"Shard({self.index}, {self.count})"
+
+
+SINGLE = Shard()
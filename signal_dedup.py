@@ -0,0 +1,114 @@
+# signal_dedup.py
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from database import DatabaseHandler
+from config import SIGNAL_DEDUP_WINDOW, SIGNAL_DEDUP_MEMORY_SIZE
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter; a False from might_contain is definite."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+
+
+class SignalDeduplicator:
+    """
+    Remembers processed signal ids for SIGNAL_DEDUP_WINDOW seconds, across restarts.
+
+    Lookups hit a bounded LRU of recent ids first, then a Bloom filter over
+    every id in the window; only a Bloom positive that is not in the LRU
+    costs a SQLite lookup. The processed_signals table and the filter are
+    pruned and rebuilt by prune(), so memory stays fixed however long the
+    engine runs. The window must be longer than the signal pool keeps
+    listing a signal, otherwise an expired id would be processed again.
+    """
+
+    def __init__(self, window=SIGNAL_DEDUP_WINDOW, memory_size=SIGNAL_DEDUP_MEMORY_SIZE):
+        self.db_handler = DatabaseHandler()
+        self.window = window
+        self.memory_size = memory_size
+        self._recent = OrderedDict()  # sig_id -> seen_at
+        self._bloom = BloomFilter(capacity=memory_size * 10)
+        self._lock = threading.Lock()
+        # Serializes claim/mark with prune(), so a rebuild cannot drop an id marked meanwhile
+        self._claim_lock = threading.RLock()
+        self.prune()
+
+    def seen(self, sig_id):
+        with self._lock:
+            if sig_id in self._recent:
+                self._recent.move_to_end(sig_id)
+                return True
+            if not self._bloom.might_contain(sig_id):
+                return False
+        conn = self.db_handler.get_connection()
+        row = conn.execute("SELECT seen_at FROM processed_signals WHERE sig_id = ?", (sig_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return False
+        with self._lock:
+            self._remember(sig_id, row['seen_at'])
+        return True
+
+    def mark(self, sig_id):
+        seen_at = int(time.time())
+        with self._claim_lock:
+            conn = self.db_handler.get_connection()
+            conn.execute("INSERT OR IGNORE INTO processed_signals (sig_id, seen_at) VALUES (?, ?)", (sig_id, seen_at))
+            conn.commit()
+            conn.close()
+            with self._lock:
+                self._remember(sig_id, seen_at)
+                self._bloom.add(sig_id)
+
+    def claim(self, sig_id):
+        """Atomically marks sig_id; returns False if it had already been processed."""
+        with self._claim_lock:
+            if self.seen(sig_id):
+                return False
+            self.mark(sig_id)
+            return True
+
+    def _remember(self, sig_id, seen_at):
+        self._recent[sig_id] = seen_at
+        self._recent.move_to_end(sig_id)
+        while len(self._recent) > self.memory_size:
+            self._recent.popitem(last=False)
+
+    def prune(self):
+        """Drops ids older than the window and rebuilds the in-memory structures."""
+        cutoff = int(time.time()) - self.window
+        with self._claim_lock:
+            conn = self.db_handler.get_connection()
+            conn.execute("DELETE FROM processed_signals WHERE seen_at < ?", (cutoff,))
+            conn.commit()
+            rows = conn.execute("SELECT sig_id, seen_at FROM processed_signals ORDER BY seen_at").fetchall()
+            conn.close()
+            with self._lock:
+                self._recent.clear()
+                self._bloom.clear()
+                for row in rows:
+                    self._bloom.add(row['sig_id'])
+                    self._remember(row['sig_id'], row['seen_at'])
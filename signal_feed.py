@@ -0,0 +1,93 @@
+# signal_feed.py
+import json
+import threading
+import requests
+from config import SIGNAL_POOL_URL, SIGNAL_PUSH_URL
+
+
+class SignalFeed:
+    """
+    Incremental reader of the signal pool.
+
+    poll() sends the newest signal_time seen so far as ?since= together with
+    If-None-Match / If-Modified-Since, so an unchanged pool costs a 304 and a
+    pool that supports the cursor only returns new signals. A body is read
+    in full and parsed from its bytes, skipping requests' text decoding and
+    charset detection.
+
+    listen() is the push mode: it keeps a streaming request open to
+    SIGNAL_PUSH_URL and parses each newline-delimited JSON signal as soon
+    as its line arrives. It runs on its own thread with its own session,
+    since requests.Session is not thread-safe and poll() keeps using
+    self.session from the scheduler thread.
+    """
+
+    def __init__(self, url=SIGNAL_POOL_URL, push_url=SIGNAL_PUSH_URL):
+        self.url = url
+        self.push_url = push_url
+        self.session = requests.Session()
+        self.etag = None
+        self.last_modified = None
+        self.cursor = None  # newest signal_time seen
+        self._cursor_lock = threading.Lock()  # poll() and listen() advance it from different threads
+
+    def _advance_cursor(self, signals):
+        with self._cursor_lock:
+            for signal in signals:
+                signal_time = signal.get('signal_time')
+                if signal_time is not None and (self.cursor is None or str(signal_time) > str(self.cursor)):
+                    self.cursor = signal_time
+
+    def poll(self):
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        params = {'since': self.cursor} if self.cursor is not None else None
+        try:
+            with self.session.get(self.url, params=params, headers=headers, timeout=5, stream=True) as resp:
+                if resp.status_code == 304:
+                    return []
+                if resp.status_code != 200:
+                    return []
+                resp.raw.decode_content = True
+                data = json.load(resp.raw)
+                self.etag = resp.headers.get('ETag')
+                self.last_modified = resp.headers.get('Last-Modified')
+        except Exception as e:
+            # خطاهای شبکه را فقط پرینت کن، اسپم نکن
+            print(f"Network Error: {e}")
+            return []
+
+        if data.get('status') == 'success' and data.get('count', 0) > 0:
+            signals = data['data']
+            self._advance_cursor(signals)
+            return signals
+        return []
+
+    def listen(self, on_signal, stop_event, reconnect_delay=2):
+        """Blocks, calling on_signal(signal) for each pushed signal, until stop_event is set."""
+        session = requests.Session()
+        while not stop_event.is_set():
+            try:
+                params = {'since': self.cursor} if self.cursor is not None else None
+                with session.get(self.push_url, params=params, stream=True, timeout=(5, 60)) as resp:
+                    resp.raise_for_status()
+                    for line in resp.iter_lines():
+                        if stop_event.is_set():
+                            return
+                        if not line:
+                            continue  # keep-alive
+                        payload = json.loads(line)
+                        signals = payload['data'] if isinstance(payload, dict) and 'data' in payload else [payload]
+                        self._advance_cursor(signals)
+                        for signal in signals:
+                            on_signal(signal)
+            except Exception as e:
+                print(f"Signal push stream error: {e}")
+            stop_event.wait(reconnect_delay)
+
+    def start_listener(self, on_signal):
+        """Runs listen() on a daemon thread; returns the event that stops it."""
+        stop_event = threading.Event()
+        threading.Thread(target=self.listen, args=(on_signal, stop_event), name="signal-push", daemon=True).start()
+        return stop_event
@@ -0,0 +1,59 @@
+# signal_router.py
+import json
+from collections import defaultdict
+from sharding import SINGLE
+
+
+class SignalRouter:
+    """
+    Inverted index from strategy / grade / coin to the ids of active users
+    subscribed to it. Routing a signal is the intersection of three sets.
+
+    The index is rebuilt only when users_version in app_meta changes; the
+    triggers created by DatabaseHandler.init_db bump it on every insert,
+    update or delete of a users row, whichever process makes it.
+    """
+
+    def __init__(self, shard=SINGLE):
+        self.shard = shard
+        self.version = None
+        self.users = {}  # user id -> users row
+        self.by_strategy = defaultdict(set)
+        self.by_grade = defaultdict(set)
+        self.by_coin = defaultdict(set)
+
+    def refresh(self, conn):
+        """Rebuilds the index if the users table changed since the last build."""
+        version = conn.execute("SELECT value FROM app_meta WHERE key = 'users_version'").fetchone()[0]
+        if version == self.version:
+            return
+        self._build(conn.execute("SELECT * FROM users WHERE is_active = 1" + self.shard.sql("id")).fetchall())
+        self.version = version
+
+    def _build(self, rows):
+        users = {}
+        by_strategy, by_grade, by_coin = defaultdict(set), defaultdict(set), defaultdict(set)
+        for user in rows:
+            try:
+                strategies = json.loads(user['allowed_strategies'] or '[]')
+                grades = json.loads(user['allowed_grades'] or '[]')
+                coins = json.loads(user['allowed_coins'] or '[]')
+            except ValueError as e:
+                print(f"Invalid filters for user {user['id']}: {e}")
+                continue
+            users[user['id']] = user
+            for strategy in strategies: by_strategy[strategy].add(user['id'])
+            for grade in grades: by_grade[grade].add(user['id'])
+            for coin in coins: by_coin[coin].add(user['id'])
+        self.users, self.by_strategy, self.by_grade, self.by_coin = users, by_strategy, by_grade, by_coin
+
+    def route(self, signal):
+        """Returns the users rows subscribed to the signal's strategy, grade and coin."""
+        candidates = sorted(
+            (self.by_strategy.get(signal['strategy_name'], set()),
+             self.by_grade.get(signal['signal_grade'], set()),
+             self.by_coin.get(signal['coin'], set())),
+            key=len,
+        )
+        user_ids = candidates[0].intersection(*candidates[1:])
+        return [self.users[user_id] for user_id in sorted(user_ids)]
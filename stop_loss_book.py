@@ -0,0 +1,96 @@
+# stop_loss_book.py
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class _SymbolColumn:
+    """Trigger prices of one symbol's positions, kept sorted, with their trade ids alongside."""
+    __slots__ = ("triggers", "trade_ids")
+
+    def __init__(self):
+        self.triggers = array('d')
+        self.trade_ids = array('q')
+
+    def insert(self, trigger, trade_id):
+        idx = bisect_right(self.triggers, trigger)
+        self.triggers.insert(idx, trigger)
+        self.trade_ids.insert(idx, trade_id)
+
+    def delete(self, trigger, trade_id):
+        lo = bisect_left(self.triggers, trigger)
+        hi = bisect_right(self.triggers, trigger)
+        for idx in range(lo, hi):
+            if self.trade_ids[idx] == trade_id:
+                del self.triggers[idx]
+                del self.trade_ids[idx]
+                return
+
+
+class StopLossBook:
+    """
+    Columnar index of open positions for stop-loss evaluation.
+
+    A position with entry price E and stop S% triggers once the market
+    price drops to E * (1 - S/100). Positions are stored per symbol sorted
+    by that trigger price, so for a market price P every position with a
+    trigger >= P is triggered: one bisect per symbol instead of a PnL
+    calculation per trade.
+    """
+
+    def __init__(self):
+        self._columns = {}    # symbol -> _SymbolColumn
+        self._positions = {}  # trade_id -> (symbol, trigger)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, trade_id):
+        return trade_id in self._positions
+
+    def add(self, trade_id, symbol, entry_price, stop_loss_percent):
+        if trade_id in self._positions:
+            self.remove(trade_id)
+        trigger = float(entry_price) * (1 - float(stop_loss_percent) / 100)
+        column = self._columns.get(symbol)
+        if column is None:
+            column = self._columns[symbol] = _SymbolColumn()
+        column.insert(trigger, trade_id)
+        self._positions[trade_id] = (symbol, trigger)
+
+    def remove(self, trade_id):
+        position = self._positions.pop(trade_id, None)
+        if position is None:
+            return
+        symbol, trigger = position
+        column = self._columns[symbol]
+        column.delete(trigger, trade_id)
+        if not column.trade_ids:
+            del self._columns[symbol]
+
+    def sync(self, positions):
+        """
+        Reconciles the book with the current open positions, given as
+        (trade_id, symbol, entry_price, stop_loss_percent) tuples. Only new
+        trades are parsed; trades that are no longer open are dropped.
+        """
+        seen = set()
+        for trade_id, symbol, entry_price, stop_loss_percent in positions:
+            seen.add(trade_id)
+            if trade_id not in self._positions:
+                self.add(trade_id, symbol, entry_price, stop_loss_percent)
+        for trade_id in self._positions.keys() - seen:
+            self.remove(trade_id)
+
+    def symbols(self):
+        return self._columns.keys()
+
+    def triggered(self, prices):
+        """Returns the ids of every position whose stop is hit by prices ({symbol: price})."""
+        hit = []
+        for symbol, column in self._columns.items():
+            price = prices.get(symbol)
+            if not price:
+                continue
+            idx = bisect_left(column.triggers, price)
+            hit.extend(column.trade_ids[idx:])
+        return hit
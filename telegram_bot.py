@@ -1,7 +1,5 @@
 # telegram_bot.py
 import logging
-import json
-import requests
 import os
 from telegram import (
     Update, 
@@ -20,10 +18,12 @@ from telegram.ext import (
     filters,
     ConversationHandler,
 )
-from database import DatabaseHandler
-from wallex_client import WallexClient
+from bot_repository import BotRepository, HandlerMetrics
+from keyboard_cache import KeyboardCache, mask_items
+from async_wallex_client import AsyncWallexClient, close_async_http
+from coin_catalogue import CoinCatalogue
 from admin_panel import AdminPanel
-from config import TELEGRAM_BOT_TOKEN, WALLEX_BASE_URL, DEFAULT_HEADERS
+from config import TELEGRAM_BOT_TOKEN
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 
@@ -34,58 +34,22 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 
 class TradingBotUI:
     def __init__(self, token):
-        self.app = ApplicationBuilder().token(token).build()
-        self.db = DatabaseHandler()
+        self.app = ApplicationBuilder().token(token).post_init(self.on_startup).post_shutdown(self.on_shutdown).build()
+        self.repo = BotRepository()
+        self.metrics = HandlerMetrics()
         self.admin = AdminPanel()
+        self.coin_catalogue = CoinCatalogue()
+        self.keyboards = KeyboardCache()
 
-    def get_paginated_keyboard(self, all_items, selected_items, page=0, items_per_page=15, prefix="COIN"):
-        keyboard = []
-        keyboard.append([
-            InlineKeyboardButton("Select All", callback_data="ALL_SELECT"),
-            InlineKeyboardButton("Deselect All", callback_data="ALL_DESELECT")
-        ])
-        start = page * items_per_page
-        end = start + items_per_page
-        current_page_items = all_items[start:end]
-        row = []
-        for item in current_page_items:
-            text = f"✅ {item}" if item in selected_items else item
-            row.append(InlineKeyboardButton(text, callback_data=f"{prefix}_{item}"))
-            if len(row) == 3:
-                keyboard.append(row)
-                row = []
-        if row: keyboard.append(row)
-        nav_row = []
-        if page > 0:
-            nav_row.append(InlineKeyboardButton("Prev", callback_data=f"PAGE_PREV"))
-        total_pages = (len(all_items) + items_per_page - 1) // items_per_page
-        nav_row.append(InlineKeyboardButton(f"Page {page+1}/{total_pages}", callback_data="NOOP"))
-        if end < len(all_items):
-            nav_row.append(InlineKeyboardButton("Next", callback_data=f"PAGE_NEXT"))
-        keyboard.append(nav_row)
-        keyboard.append([InlineKeyboardButton("Save Account", callback_data=f"CONFIRM_{prefix}")])
-        return InlineKeyboardMarkup(keyboard)
+    def get_paginated_keyboard(self, all_items, selected_mask, page=0, items_per_page=15, prefix="COIN"):
+        return self.keyboards.paginated(all_items, selected_mask, page, items_per_page, prefix)
 
     def get_simple_keyboard(self, options, selected_list, prefix):
-        keyboard = []
-        row = []
-        for opt in options:
-            text = f"✅ {opt}" if opt in selected_list else opt
-            row.append(InlineKeyboardButton(text, callback_data=f"{prefix}_{opt}"))
-            if len(row) == 2:
-                keyboard.append(row)
-                row = []
-        if row: keyboard.append(row)
-        keyboard.append([InlineKeyboardButton("Confirm", callback_data=f"CONFIRM_{prefix}")])
-        return InlineKeyboardMarkup(keyboard)
+        return self.keyboards.simple(options, selected_list, prefix)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT count(*) FROM users WHERE telegram_id = ?", (user.id,))
-        count = cursor.fetchone()[0]
-        conn.close()
+        count = await self.repo.count_accounts(user.id)
 
         if count > 0:
             await self.show_main_menu(update, user)
@@ -154,11 +118,8 @@ class TradingBotUI:
         api_key = update.message.text.strip()
         await update.message.reply_text("Validating...")
         try:
-            url = f"{WALLEX_BASE_URL}/v1/account/balances"
-            headers = DEFAULT_HEADERS.copy()
-            headers["X-API-Key"] = api_key
-            resp = requests.get(url, headers=headers, timeout=10)
-            if resp.status_code == 200:
+            resp = await AsyncWallexClient(api_key).get_balances()
+            if resp.get('success'):
                 context.user_data['api_key'] = api_key
                 context.user_data['strategies'] = []
                 markup = self.get_simple_keyboard(['Internal', 'G1', 'Computiational'], [], "STRAT")
@@ -199,12 +160,12 @@ class TradingBotUI:
         if data == "CONFIRM_GRADE":
             if not curr: return GET_GRADES
             await query.message.edit_text("Fetching coins...")
-            client = WallexClient()
-            all_coins = client.get_available_coins()
+            # Shared tuple; the conversation keeps a reference, selections are a bitset over it
+            all_coins = await self.coin_catalogue.get()
             context.user_data['all_available_coins'] = all_coins
-            context.user_data['coins'] = [] 
+            context.user_data['coins'] = 0
             context.user_data['page'] = 0   
-            markup = self.get_paginated_keyboard(all_coins, [], page=0)
+            markup = self.get_paginated_keyboard(all_coins, 0, page=0)
             await query.message.reply_text("Step 10: Select Coins:", reply_markup=markup)
             return GET_COINS
         elif data.startswith("GRADE_"):
@@ -220,18 +181,18 @@ class TradingBotUI:
         try: await query.answer()
         except: pass
         data = query.data
-        selected_coins = context.user_data.get('coins', [])
-        all_coins = context.user_data.get('all_available_coins', [])
+        selected_coins = context.user_data.get('coins', 0)
+        all_coins = context.user_data.get('all_available_coins', ())
         current_page = context.user_data.get('page', 0)
 
         if data == "ALL_SELECT":
-            selected_coins = list(all_coins)
+            selected_coins = (1 << len(all_coins)) - 1
             context.user_data['coins'] = selected_coins
             markup = self.get_paginated_keyboard(all_coins, selected_coins, page=current_page)
             await query.edit_message_reply_markup(reply_markup=markup)
             return GET_COINS
         elif data == "ALL_DESELECT":
-            selected_coins = []
+            selected_coins = 0
             context.user_data['coins'] = selected_coins
             markup = self.get_paginated_keyboard(all_coins, selected_coins, page=current_page)
             await query.edit_message_reply_markup(reply_markup=markup)
@@ -254,30 +215,16 @@ class TradingBotUI:
             await query.message.edit_text("Saving...")
             user_id = update.effective_user.id
             d = context.user_data
-            conn = self.db.get_connection()
             try:
-                conn.execute('''
-                    INSERT INTO users (
-                        telegram_id, account_name, full_name, phone_number, wallex_api_key,
-                        buy_amount_tmn, buy_amount_usdt, stop_loss_percent,
-                        allowed_strategies, allowed_grades, allowed_coins, is_active
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-                ''', (
-                    user_id, d['account_name'], d['full_name'], d['phone'], d['api_key'],
-                    d['buy_tmn'], d['buy_usdt'], d['stop_loss'],
-                    json.dumps(d['strategies']), json.dumps(d['grades']), json.dumps(selected_coins)
-                ))
-                conn.commit()
+                await self.repo.create_account(user_id, d, mask_items(all_coins, selected_coins))
                 await query.message.reply_text("Account created!")
                 await self.show_main_menu(update, update.effective_user)
             except Exception as e:
                 logging.error(e)
-            finally: conn.close()
             return ConversationHandler.END
         elif data.startswith("COIN_"):
-            coin_symbol = data.split("_")[1]
-            if coin_symbol in selected_coins: selected_coins.remove(coin_symbol)
-            else: selected_coins.append(coin_symbol)
+            coin_index = int(data.split("_")[1])
+            selected_coins ^= 1 << coin_index
             context.user_data['coins'] = selected_coins
             markup = self.get_paginated_keyboard(all_coins, selected_coins, page=current_page)
             await query.edit_message_reply_markup(reply_markup=markup)
@@ -291,11 +238,7 @@ class TradingBotUI:
 
     async def manage_accounts_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (user_id,))
-        users = cursor.fetchall()
-        conn.close()
+        users = await self.repo.list_accounts(user_id)
         if not users:
             await update.message.reply_text("No accounts.")
             return
@@ -313,20 +256,12 @@ class TradingBotUI:
         parts = data.split("_")
         action = parts[1]
         acc_id = parts[2]
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
         if action == "TOGGLE":
-            cursor.execute("SELECT is_active FROM users WHERE id=?", (acc_id,))
-            curr = cursor.fetchone()[0]
-            new_s = 0 if curr else 1
-            cursor.execute("UPDATE users SET is_active=? WHERE id=?", (new_s, acc_id))
-            conn.commit()
+            new_s = await self.repo.toggle_account(acc_id)
             await query.message.edit_text(f"Status changed to {'Active' if new_s else 'Inactive'}")
         elif action == "DELETE":
-            cursor.execute("DELETE FROM users WHERE id=?", (acc_id,))
-            conn.commit()
+            await self.repo.delete_account(acc_id)
             await query.message.edit_text("Deleted.")
-        conn.close()
 
     async def menu_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         text = update.message.text
@@ -337,33 +272,43 @@ class TradingBotUI:
 
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not self.admin.is_admin(update.effective_user.id): return
-        stats = self.admin.get_quick_stats()
-        await update.message.reply_text(stats)
+        stats = await self.repo.run(self.admin.get_quick_stats)
+        latency = self.metrics.report()
+        await update.message.reply_text(f"{stats}\n\nHandler latency:\n{latency}" if latency else stats)
 
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Cancelled.")
         return ConversationHandler.END
 
+    async def on_startup(self, app):
+        self.coin_catalogue.start()
+
+    async def on_shutdown(self, app):
+        await self.coin_catalogue.stop()
+        await close_async_http()
+        self.repo.shutdown()
+
     def run(self):
+        t = self.metrics.wrap
         conv = ConversationHandler(
-            entry_points=[CommandHandler("start", self.start), MessageHandler(filters.Regex('Add New Account'), self.add_new_account)],
+            entry_points=[CommandHandler("start", t(self.start)), MessageHandler(filters.Regex('Add New Account'), t(self.add_new_account))],
             states={
-                GET_ACCOUNT_NAME: [MessageHandler(filters.TEXT, self.get_account_name)],
-                GET_NAME: [MessageHandler(filters.TEXT, self.get_name)],
-                GET_PHONE: [MessageHandler(filters.CONTACT | filters.TEXT, self.get_phone)],
-                GET_CAPITAL_TMN: [MessageHandler(filters.TEXT, self.get_capital_tmn)],
-                GET_CAPITAL_USDT: [MessageHandler(filters.TEXT, self.get_capital_usdt)],
-                GET_STOP_LOSS: [MessageHandler(filters.TEXT, self.get_stop_loss)],
-                GET_API: [MessageHandler(filters.TEXT, self.get_api)],
-                GET_STRATEGIES: [CallbackQueryHandler(self.get_strategies_step)],
-                GET_GRADES: [CallbackQueryHandler(self.get_grades_step)],
-                GET_COINS: [CallbackQueryHandler(self.get_coins_step)],
+                GET_ACCOUNT_NAME: [MessageHandler(filters.TEXT, t(self.get_account_name))],
+                GET_NAME: [MessageHandler(filters.TEXT, t(self.get_name))],
+                GET_PHONE: [MessageHandler(filters.CONTACT | filters.TEXT, t(self.get_phone))],
+                GET_CAPITAL_TMN: [MessageHandler(filters.TEXT, t(self.get_capital_tmn))],
+                GET_CAPITAL_USDT: [MessageHandler(filters.TEXT, t(self.get_capital_usdt))],
+                GET_STOP_LOSS: [MessageHandler(filters.TEXT, t(self.get_stop_loss))],
+                GET_API: [MessageHandler(filters.TEXT, t(self.get_api))],
+                GET_STRATEGIES: [CallbackQueryHandler(t(self.get_strategies_step))],
+                GET_GRADES: [CallbackQueryHandler(t(self.get_grades_step))],
+                GET_COINS: [CallbackQueryHandler(t(self.get_coins_step))],
             },
-            fallbacks=[CommandHandler("cancel", self.cancel)]
+            fallbacks=[CommandHandler("cancel", t(self.cancel))]
         )
         self.app.add_handler(conv)
-        self.app.add_handler(CallbackQueryHandler(self.account_action, pattern="^ACC_"))
-        self.app.add_handler(MessageHandler(filters.TEXT, self.menu_handler))
+        self.app.add_handler(CallbackQueryHandler(t(self.account_action), pattern="^ACC_"))
+        self.app.add_handler(MessageHandler(filters.TEXT, t(self.menu_handler)))
         print("Bot Running...")
         self.app.run_polling()
 
@@ -0,0 +1,174 @@
+# trade_journal.py
+import json
+import os
+import threading
+from database import DatabaseHandler, TRADES_COLUMNS
+from sharding import SINGLE
+from config import TRADE_JOURNAL_PATH, TRADE_JOURNAL_FLUSH_INTERVAL, TRADE_JOURNAL_BATCH_SIZE
+
+
+class TradeJournal:
+    """
+    Write-behind queue for trade inserts and state transitions.
+
+    insert_trade() / update_trade() append the change to an append-only
+    log file (handed to the OS, not fsynced) and to an in-memory queue, then
+    return. A background thread applies queued changes to SQLite in one
+    transaction every TRADE_JOURNAL_FLUSH_INTERVAL seconds, or as soon as
+    TRADE_JOURNAL_BATCH_SIZE are waiting.
+
+    Every entry carries a sequence number. The last applied one is stored in
+    app_meta in the same transaction, so after a crash replay() applies
+    exactly the logged entries that never reached the database.
+
+    Trade ids are allocated here, so callers can refer to a new trade
+    before its row exists. Code that reads trades back from SQLite should
+    call flush() first. In a sharded runtime each shard has its own log and
+    sequence key, and allocates ids from its own stripe (see Shard).
+    """
+
+    def __init__(self, path=TRADE_JOURNAL_PATH, flush_interval=TRADE_JOURNAL_FLUSH_INTERVAL,
+                 batch_size=TRADE_JOURNAL_BATCH_SIZE, shard=SINGLE):
+        self.db_handler = DatabaseHandler()
+        self.shard = shard
+        self.path = shard.journal_path(path)
+        self.seq_key = shard.journal_key
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._closed = False
+        self.positions = None  # PositionBook kept current with every logged update
+
+        conn = self.db_handler.get_connection()
+        conn.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES (?, 0)", (self.seq_key,))
+        conn.commit()
+        conn.close()
+        self.replay()
+        conn = self.db_handler.get_connection()
+        self._seq = conn.execute("SELECT value FROM app_meta WHERE key = ?", (self.seq_key,)).fetchone()[0]
+        self._next_trade_id = shard.first_trade_id(conn.execute("SELECT MAX(id) FROM trades").fetchone()[0])
+        conn.close()
+
+        self._log = open(self.path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="trade-journal", daemon=True)
+        self._thread.start()
+
+    def insert_trade(self, **fields):
+        """Queues a new trades row and returns the id it will have."""
+        with self._lock:
+            fields['id'] = self._next_trade_id
+            self._next_trade_id += self.shard.count
+            self._append('insert', fields)
+        return fields['id']
+
+    def update_trade(self, trade_id, **fields):
+        with self._lock:
+            if self._append('update', dict(fields, id=trade_id)) and self.positions is not None:
+                self.positions.update(trade_id, fields)
+
+    def _append(self, op, fields):
+        unknown = fields.keys() - set(TRADES_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown trades columns: {unknown}")
+        if self._closed:
+            # Shutdown ordering should make this unreachable; the change is printed so it can be applied by hand
+            print(f"❌ Trade journal is closed, {op} NOT recorded: {json.dumps(fields)}")
+            return False
+        self._seq += 1
+        entry = {'seq': self._seq, 'op': op, 'fields': fields}
+        self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+        self._pending.append(entry)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    @staticmethod
+    def _apply(cursor, entry):
+        fields = entry['fields']
+        if entry['op'] == 'insert':
+            columns = list(fields)
+            cursor.execute(
+                f"INSERT OR IGNORE INTO trades ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [fields[c] for c in columns]
+            )
+        else:
+            columns = [c for c in fields if c != 'id']
+            cursor.execute(
+                f"UPDATE trades SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                [fields[c] for c in columns] + [fields['id']]
+            )
+
+    def _write_batch(self, entries):
+        conn = self.db_handler.get_connection()
+        try:
+            cursor = conn.cursor()
+            for entry in entries:
+                self._apply(cursor, entry)
+            cursor.execute("UPDATE app_meta SET value = ? WHERE key = ?", (entries[-1]['seq'], self.seq_key))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def flush(self):
+        """Applies everything queued so far in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            except Exception:
+                # Keep the batch (it is still in the log) and retry on the next flush
+                with self._lock:
+                    self._pending = batch + self._pending
+                raise
+            with self._lock:
+                if not self._pending:
+                    # Everything logged is now in SQLite
+                    self._log.truncate(0)
+                    self._log.seek(0)
+
+    def replay(self):
+        """Applies log entries newer than the last sequence number SQLite has seen."""
+        if not os.path.exists(self.path):
+            return
+        conn = self.db_handler.get_connection()
+        applied = conn.execute("SELECT value FROM app_meta WHERE key = ?", (self.seq_key,)).fetchone()[0]
+        conn.close()
+        entries = []
+        with open(self.path, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash mid-write
+                if entry['seq'] > applied:
+                    entries.append(entry)
+        if entries:
+            self._write_batch(entries)
+            print(f"♻️ Replayed {len(entries)} trade journal entries.")
+        open(self.path, 'w').close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Trade journal flush failed: {e}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+        self._log.close()
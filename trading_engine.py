@@ -1,54 +1,63 @@
 # trading_engine.py
-import json
 import time
-from datetime import datetime
 from database import DatabaseHandler
-from wallex_client import WallexClient
+from wallex_client import get_client
+from order_dispatcher import OrderDispatcher
+from exposure_ledger import ExposureLedger
+from signal_router import SignalRouter
+from order_monitor import OrderStatusPoller
+from trade_journal import TradeJournal
+from market_data import MarketCatalog
+from metrics import stage, SIGNAL_TO_ORDER_SECONDS, ORDERS_TOTAL
+from sharding import SINGLE
+from position_book import PositionBook
+from rate_limiter import request_priority, PRIORITY_MANAGE
 from config import BUY_TIMEOUT_SECONDS
 
 class TradingEngine:
-    def __init__(self):
+    def __init__(self, shard=SINGLE):
         self.db_handler = DatabaseHandler() # Correct attribute name
-
-    def process_signal(self, signal_data):
-        print(f"📩 Signal: {signal_data['coin']} | Strategy: {signal_data['strategy_name']}")
+        # Only this shard's users are routed, monitored and counted in exposure
+        self.shard = shard
+        self.dispatcher = OrderDispatcher()
+        # Replays any trade changes that had not reached the database before a crash
+        self.journal = TradeJournal(shard=shard)
+        # Open positions live in memory; the journal keeps the book current as it logs changes
+        self.positions = PositionBook(shard)
+        self.journal.positions = self.positions
+        self.exposure = ExposureLedger()
+        self.router = SignalRouter(shard)
+        self.poller = OrderStatusPoller()
+        # Step / tick sizes for rounding orders locally, refreshed in the background
+        self.markets = MarketCatalog()
+        self.markets.start_refresh()
         conn = self.db_handler.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE is_active = 1")
-        users = cursor.fetchall()
-        
-        for user in users:
-            if self._is_user_eligible(user, signal_data, conn):
-                self._place_buy_order_for_user(user, signal_data, conn)
-            
+        self.exposure.rebuild(conn, shard)
+        self.positions.load(conn)
         conn.close()
 
-    def _is_user_eligible(self, user, signal, conn):
+    def process_signal(self, signal_data):
+        print(f"📩 Signal: {signal_data['coin']} | Strategy: {signal_data['strategy_name']} | trace {signal_data.get('trace_id')}")
+        conn = self.db_handler.get_connection()
         try:
-            strats_json = user['allowed_strategies'] if user['allowed_strategies'] else '[]'
-            allowed_strategies = json.loads(strats_json)
-            if signal['strategy_name'] not in allowed_strategies:
-                return False
-
-            grades_json = user['allowed_grades'] if user['allowed_grades'] else '[]'
-            allowed_grades = json.loads(grades_json)
-            if signal['signal_grade'] not in allowed_grades:
-                return False
+            with stage("signal", "route"):
+                self.router.refresh(conn)
+                users = self.router.route(signal_data)
+                eligible_users = [user for user in users if self._is_user_eligible(user, signal_data)]
+            if eligible_users:
+                with stage("signal", "dispatch"):
+                    results = self.dispatcher.dispatch(
+                        eligible_users, lambda user: self._place_buy_order_for_user(user, signal_data)
+                    )
+                with stage("signal", "record"):
+                    self._record_buy_orders(results, signal_data)
+        finally:
+            conn.close()
 
-            coins_json = user['allowed_coins'] if user['allowed_coins'] else '[]'
-            allowed_coins = json.loads(coins_json)
-            if signal['coin'] not in allowed_coins:
-                return False
-
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT SUM(buy_amount * CAST(signal_entry_price AS REAL)) 
-                FROM trades 
-                WHERE user_id = ? AND (sell_status != 'SUCCESSFUL_TRADE' AND sell_status != 'STOP_LOSS_FILLED' AND buy_status != 'FAILED')
-            ''', (user['id'],))
-            res = cursor.fetchone()
-            current_frozen = res[0] if res and res[0] else 0
+    def _is_user_eligible(self, user, signal):
+        # Strategy / grade / coin filters are already applied by SignalRouter
+        try:
+            current_frozen = self.exposure.get(user['id'], signal['pair'])
             
             if signal['pair'] == 'TMN':
                 max_limit = user['max_frozen_tmn']
@@ -67,79 +76,90 @@ class TradingEngine:
             print(f"Error checking eligibility: {e}")
             return False
 
-    def _place_buy_order_for_user(self, user, signal, conn):
-        client = WallexClient(user['wallex_api_key'])
+    def _place_buy_order_for_user(self, user, signal):
+        """Sends the buy order only; the result is persisted later by _record_buy_orders."""
+        client = get_client(user['wallex_api_key'])
         
         symbol = f"{signal['coin']}{signal['pair']}"
         entry_price = signal['entry_price']
         
         budget = user['buy_amount_tmn'] if signal['pair'] == 'TMN' else user['buy_amount_usdt']
         
-        # In a real scenario, fetch precision from market info
-        raw_quantity = float(budget) / float(entry_price)
+        order = self.markets.quantize(symbol, "BUY", float(budget) / float(entry_price), entry_price)
+        if order is None:
+            return {"success": False, "message": f"Order below {symbol} minimum size"}
+        quantity, price = order
         
-        resp = client.place_order(symbol, "BUY", "LIMIT", raw_quantity, entry_price)
-        
-        cursor = conn.cursor()
-        if resp.get('success'):
-            order_id = resp['result']['clientOrderId']
-            print(f"✅ Buy order placed: {symbol} for {user['full_name']}")
-            
-            cursor.execute('''
-                INSERT INTO trades (user_id, coin_pair, signal_entry_price, signal_target_price, 
-                                  strategy_name, signal_grade,
-                                  buy_order_id, buy_amount, buy_status, buy_submit_time, sell_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user['id'], symbol, entry_price, signal['target_price'], 
-                  signal['strategy_name'], signal['signal_grade'],
-                  order_id, raw_quantity, 'BUY_SUBMITTED', datetime.now(), 'PENDING'))
-        else:
-            print(f"❌ Buy error: {resp.get('message')}")
-        conn.commit()
+        resp = client.place_order(symbol, "BUY", "LIMIT", quantity, price)
+        ORDERS_TOTAL.inc(side="BUY", outcome="ok" if resp.get('success') else "error")
+        if 'received_at' in signal:
+            SIGNAL_TO_ORDER_SECONDS.observe(time.monotonic() - signal['received_at'])
+        resp['quantity'] = float(quantity)
+        resp['submit_time'] = int(time.time())
+        return resp
 
-    def monitor_orders(self):
-        conn = self.db_handler.get_connection() # Fixed: use self.db_handler
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM trades WHERE buy_status = 'BUY_SUBMITTED'")
-        active_buys = cursor.fetchall()
-        for trade in active_buys:
-            self._check_buy_status(trade, conn)
-        conn.close()
+    def _record_buy_orders(self, results, signal):
+        symbol = f"{signal['coin']}{signal['pair']}"
+        for user, resp in results:
+            if resp.get('success'):
+                print(f"✅ Buy order placed: {symbol} for {user['full_name']} | trace {signal.get('trace_id')}")
+                fields = dict(
+                    user_id=user['id'], coin_pair=symbol,
+                    signal_entry_price=float(signal['entry_price']),
+                    signal_target_price=float(signal['target_price']),
+                    buy_order_id=resp['result']['clientOrderId'], buy_amount=resp['quantity'],
+                    buy_status='BUY_SUBMITTED', buy_submit_time=resp['submit_time'], sell_status='PENDING'
+                )
+                trade_id = self.journal.insert_trade(
+                    strategy_name=signal['strategy_name'], signal_grade=signal['signal_grade'], **fields
+                )
+                self.positions.open(trade_id, user, **fields)
+                self.exposure.open_trade(trade_id, user['id'], symbol,
+                                         resp['quantity'] * float(signal['entry_price']))
+            else:
+                print(f"❌ Buy error for {user['full_name']}: {resp.get('message')}")
 
-    def _check_buy_status(self, trade, conn):
-        cursor = conn.cursor()
-        cursor.execute("SELECT wallex_api_key FROM users WHERE id = ?", (trade['user_id'],))
-        user_row = cursor.fetchone()
-        if not user_row: return
-        
-        client = WallexClient(user_row['wallex_api_key'])
-        status_resp = client.get_order_status(trade['buy_order_id'])
+    def monitor_orders(self):
+        with stage("monitor", "query"):
+            conn = self.db_handler.get_connection() # Fixed: use self.db_handler
+            try:
+                self.positions.sync_users(conn)
+            finally:
+                conn.close()
+            active_buys = self.poller.due(self.positions.with_buy_status('BUY_SUBMITTED'))
         
-        if not status_resp.get('success'): return
+        with stage("monitor", "fetch"):
+            statuses = self.poller.fetch(active_buys)
+        # فروش هدف و لغو خرید به پوزیشن‌های باز مربوط است و جلوتر از خریدهای جدید ارسال می‌شود
+        with stage("monitor", "apply"), request_priority(PRIORITY_MANAGE):
+            for trade in active_buys:
+                if trade.id in statuses:
+                    self._check_buy_status(trade, statuses[trade.id])
 
-        status = status_resp['result']['status']
+    def _check_buy_status(self, trade, status):
+        client = get_client(trade.wallex_api_key)
         
         if status == 'FILLED':
-            print(f"🎉 Buy filled for {trade['coin_pair']}. Placing Sell...")
-            sell_resp = client.place_order(
-                trade['coin_pair'], "SELL", "LIMIT", 
-                trade['buy_amount'], trade['signal_target_price']
-            )
+            print(f"🎉 Buy filled for {trade.coin_pair}. Placing Sell...")
+            order = self.markets.quantize(trade.coin_pair, "SELL", trade.buy_amount, trade.signal_target_price)
+            if order is None:
+                sell_resp = {"success": False, "message": f"Order below {trade.coin_pair} minimum size"}
+            else:
+                sell_resp = client.place_order(trade.coin_pair, "SELL", "LIMIT", *order)
+                ORDERS_TOTAL.inc(side="SELL", outcome="ok" if sell_resp.get('success') else "error")
             
             if sell_resp.get('success'):
                 sell_id = sell_resp['result']['clientOrderId']
-                cursor.execute('''
-                    UPDATE trades SET buy_status = 'FILLED', sell_status = 'SUBMITTED', sell_order_id = ?
-                    WHERE id = ?
-                ''', (sell_id, trade['id']))
+                self.journal.update_trade(trade.id, buy_status='FILLED', sell_status='SUBMITTED',
+                                          sell_order_id=sell_id)
             else:
-                cursor.execute("UPDATE trades SET log_message = ? WHERE id = ?", 
-                             (f"Sell Err: {sell_resp.get('message')}", trade['id']))
+                self.journal.update_trade(trade.id, log_message=f"Sell Err: {sell_resp.get('message')}")
         else:
-            submit_time = datetime.strptime(trade['buy_submit_time'], "%Y-%m-%d %H:%M:%S.%f")
-            if (datetime.now() - submit_time).total_seconds() > BUY_TIMEOUT_SECONDS:
-                print(f"⏳ Buy timeout for {trade['coin_pair']}.")
-                client.cancel_order(trade['buy_order_id'])
-                cursor.execute("UPDATE trades SET buy_status = 'TIMEOUT_CANCELLED' WHERE id = ?", (trade['id'],))
-        
-        conn.commit()
+            remaining = BUY_TIMEOUT_SECONDS - (time.time() - trade.buy_submit_time)
+            if remaining < 0:
+                print(f"⏳ Buy timeout for {trade.coin_pair}.")
+                client.cancel_order(trade.buy_order_id)
+                self.journal.update_trade(trade.id, buy_status='TIMEOUT_CANCELLED')
+                self.exposure.close_trade(trade.id)
+            else:
+                self.poller.reschedule(trade.id, status, time.monotonic() + remaining)
@@ -1,77 +1,181 @@
 # wallex_client.py
+import threading
+from collections import OrderedDict
 import requests
-from config import WALLEX_BASE_URL, DEFAULT_HEADERS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    WALLEX_BASE_URL, DEFAULT_HEADERS, HTTP_POOL_MAXSIZE, HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_FACTOR, CLIENT_CACHE_SIZE
+)
+from metrics import timed, WALLEX_REQUEST_SECONDS
+from rate_limiter import (
+    get_request_scheduler, current_priority,
+    PRIORITY_ORDER, PRIORITY_POLL, PRIORITY_PRICE
+)
+from config import RATE_LIMIT_MAX_RETRIES
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Process-wide keep-alive session shared by every WallexClient."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Only idempotent requests are retried; a retried POST could place a duplicate order.
+            # 429 is left to WallexClient._request so the retry goes back through the rate limiter
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "DELETE"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE,
+                                  max_retries=retry, pool_block=True)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+# لیست اضطراری در صورت خرابی API
+FALLBACK_COINS = ('BTC', 'ETH', 'USDT', 'TRX', 'SHIB', 'DOGE', 'ADA', 'XRP', 'LTC', 'BCH')
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+def get_client(api_key=None):
+    """Returns a cached WallexClient for api_key, evicting the least recently used one."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is not None:
+            _clients.move_to_end(api_key)
+            return client
+        client = WallexClient(api_key)
+        _clients[api_key] = client
+        if len(_clients) > CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+        return client
 
 class WallexClient:
     def __init__(self, api_key=None):
         self.base_url = WALLEX_BASE_URL
+        self.api_key = api_key
         self.headers = DEFAULT_HEADERS.copy()
         if api_key:
             self.headers["X-API-Key"] = api_key
+        self.session = get_session()
+        self.scheduler = get_request_scheduler()
+
+    def _request(self, method, path, priority, **kwargs):
+        """
+        Sends one request once the rate limiter admits it. A 429 holds back
+        this key's bucket for the server's Retry-After and the request is
+        queued again (a rejected POST placed nothing, so resending it is safe).
+        """
+        priority = current_priority(priority)
+        for _ in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.scheduler.acquire(self.api_key, priority)
+            resp = self.session.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs)
+            if resp.status_code != 429:
+                return resp
+            self.scheduler.penalize(self.api_key, _retry_after(resp))
+        return resp
 
-    def get_market_info(self, symbol):
-        url = f"{self.base_url}/hector/web/v1/markets"
+    @timed(WALLEX_REQUEST_SECONDS, method="get_markets")
+    def get_markets(self):
+        """مشخصات همه بازارها (دقت قیمت و مقدار، حداقل سفارش) با یک درخواست: {symbol: market}"""
         try:
-            resp = requests.get(url, headers=self.headers, timeout=5)
+            resp = self._request("GET", "/v1/markets", PRIORITY_PRICE, timeout=10)
             if resp.status_code == 200:
                 data = resp.json()
                 if data.get('success'):
-                    for m in data['result']['markets']:
-                        if m['symbol'] == symbol:
-                            return m
+                    return data['result']['symbols']
         except Exception as e:
             print(f"API Error: {e}")
         return None
 
-    def get_available_coins(self):
-        """دریافت لیست کامل و یکتای ارزها از والکس"""
-        # /hector/web/v1/markets
-        url = f"{self.base_url}/hector/web/v1/markets"
-        try:
-            resp = requests.get(url, headers=self.headers, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get('success'):
-                    coins = set()
-                    for m in data['result']['markets']:
-                        # استخراج نام ارز پایه (مثلا از BTCUSDT -> BTC)
-                        base = m.get('base_asset')
-                        if base:
-                            coins.add(base)
-                    
-                    # مرتب‌سازی الفبایی
-                    return sorted(list(coins))
-        except Exception as e:
-            print(f"Error fetching coins: {e}")
-        # لیست اضطراری در صورت خرابی API
-        return ['BTC', 'ETH', 'USDT', 'TRX', 'SHIB', 'DOGE', 'ADA', 'XRP', 'LTC', 'BCH']
-
     # ... (بقیه توابع: get_last_price, place_order, get_order_status, cancel_order بدون تغییر)
     # حتما توابع قبلی که برای ترید و کنسل کردن بود را اینجا نگه دارید
+    @timed(WALLEX_REQUEST_SECONDS, method="get_last_price")
     def get_last_price(self, symbol):
-        url = f"{self.base_url}/v1/trades?symbol={symbol}"
         try:
-            resp = requests.get(url, headers=self.headers, timeout=5)
+            resp = self._request("GET", "/v1/trades", PRIORITY_PRICE, params={"symbol": symbol}, timeout=5)
             if resp.status_code == 200 and resp.json().get('success'):
                 return float(resp.json()['result']['latestTrades'][0]['price'])
         except: pass
         return None
 
+    @timed(WALLEX_REQUEST_SECONDS, method="get_all_last_prices")
+    def get_all_last_prices(self):
+        """آخرین قیمت همه بازارها با یک درخواست: {symbol: price}"""
+        prices = {}
+        try:
+            resp = self._request("GET", "/v1/markets", PRIORITY_PRICE, timeout=5)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('success'):
+                    for symbol, market in data['result']['symbols'].items():
+                        last_price = (market.get('stats') or {}).get('lastPrice')
+                        if last_price not in (None, '', '-'):
+                            prices[symbol] = float(last_price)
+        except Exception as e:
+            print(f"API Error: {e}")
+        return prices
+
+    @timed(WALLEX_REQUEST_SECONDS, method="get_order_book")
+    def get_order_book(self, symbol):
+        """دفتر سفارش نماد: (bids, asks) هر کدام لیست (قیمت، مقدار) از بهترین قیمت؛ در صورت خطا None"""
+        try:
+            resp = self._request("GET", "/v1/depth", PRIORITY_PRICE, params={"symbol": symbol}, timeout=5)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('success'):
+                    result = data['result']
+                    bids = sorted(((float(l['price']), float(l['quantity'])) for l in result.get('bid') or []), reverse=True)
+                    asks = sorted((float(l['price']), float(l['quantity'])) for l in result.get('ask') or [])
+                    return bids, asks
+        except Exception as e:
+            print(f"API Error: {e}")
+        return None
+
+    @timed(WALLEX_REQUEST_SECONDS, method="place_order")
     def place_order(self, symbol, side, type, quantity, price=None):
-        url = f"{self.base_url}/v1/account/orders"
         payload = {"symbol": symbol, "side": side, "type": type, "quantity": str(quantity)}
         if price: payload["price"] = str(price)
         try:
-            return requests.post(url, json=payload, headers=self.headers, timeout=10).json()
+            return self._request("POST", "/v1/account/orders", PRIORITY_ORDER, json=payload, timeout=10).json()
         except Exception as e:
             return {"success": False, "message": str(e)}
 
+    @timed(WALLEX_REQUEST_SECONDS, method="get_order_status")
     def get_order_status(self, client_order_id):
-        url = f"{self.base_url}/v1/account/orders/{client_order_id}"
-        try: return requests.get(url, headers=self.headers, timeout=10).json()
+        try: return self._request("GET", f"/v1/account/orders/{client_order_id}", PRIORITY_POLL, timeout=10).json()
         except: return {"success": False}
 
+    @timed(WALLEX_REQUEST_SECONDS, method="get_open_orders")
+    def get_open_orders(self, symbol=None):
+        """سفارش‌های باز حساب با یک درخواست؛ در صورت خطا None"""
+        params = {"symbol": symbol} if symbol else None
+        try:
+            resp = self._request("GET", "/v1/account/openOrders", PRIORITY_POLL, params=params, timeout=10)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get('success'):
+                    return data['result']['orders']
+        except Exception as e:
+            print(f"API Error: {e}")
+        return None
+
+    @timed(WALLEX_REQUEST_SECONDS, method="cancel_order")
     def cancel_order(self, client_order_id):
-        url = f"{self.base_url}/v1/account/orders/{client_order_id}"
-        try: requests.delete(url, headers=self.headers, timeout=10); return {"success": True}
+        try: self._request("DELETE", f"/v1/account/orders/{client_order_id}", PRIORITY_ORDER, timeout=10); return {"success": True}
         except: return {"success": False}